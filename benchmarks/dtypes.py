@@ -0,0 +1,101 @@
+"""Memory saved by the categorical COMPACT_COLUMNS on a large combined output.
+
+    python -m benchmarks.dtypes [--rows 200000] [--sheets 4]
+
+Generates a workbook big enough to split into about --rows rows, runs the
+splitter on every sheet, combines the sheets like the "one combined sheet"
+output does, and compares the result with the same frame holding plain
+object-dtype strings in those columns. Both pandas' deep memory_usage and
+the memory actually retained (tracemalloc) are reported: deep usage counts
+a repeated string once per row even when every row points at the same
+object, so it overstates what object columns really cost.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def concat_frames(frames, compact_columns):
+    """pd.concat(frames, ignore_index=True) that keeps compact_columns categorical.
+
+    pd.concat falls back to object dtype when categoricals disagree on their
+    categories, which sheets with different Product / Akad values always do,
+    so each column is first recoded onto the union of the categories.
+    """
+    import pandas as pd
+
+    frames = list(frames)
+    for col in compact_columns:
+        columns = [df[col] for df in frames if col in df.columns]
+        if not columns or not all(isinstance(column.dtype, pd.CategoricalDtype) for column in columns):
+            continue
+        categories = pd.api.types.union_categoricals([column.array for column in columns]).categories
+        frames = [
+            df.assign(**{col: df[col].cat.set_categories(categories)}) if col in df.columns else df
+            for df in frames
+        ]
+    return pd.concat(frames, ignore_index=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.dtypes', description="Measure the memory saved by compact column dtypes.")
+    parser.add_argument('--rows', type=int, default=200000, help="Approximate rows in the combined output")
+    parser.add_argument('--sheets', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=8, help="Most steps per test script")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.workbooks import write_workbook
+    from modules.cache import frame_nbytes
+    from modules.splitter import funding_transform
+    from modules.transform import COMPACT_COLUMNS
+    from modules.workbook import NamedBytesIO, WorkbookSession, read_test_sheet
+
+    # Scripts have 1..steps steps, (steps + 1) / 2 on average
+    scripts = math.ceil(args.rows / args.sheets / ((args.steps + 1) / 2))
+    source = io.BytesIO()
+    write_workbook(source, scripts=scripts, steps=args.steps, sheets=args.sheets)
+    data = source.getvalue()
+    del source
+
+    tracemalloc.start()
+    try:
+        with WorkbookSession(NamedBytesIO(data, 'dtypes [funding].xlsx')) as workbook:
+            sheets = [read_test_sheet(workbook, sheet_name) for sheet_name in workbook.sheet_names]
+        baseline = tracemalloc.get_traced_memory()[0]
+        combined = concat_frames((funding_transform(sheet, 'EP-1', 'Feature', 'Squad') for sheet in sheets), COMPACT_COLUMNS)
+        compact_retained = tracemalloc.get_traced_memory()[0] - baseline
+        compact_deep = frame_nbytes(combined)
+
+        combined = combined.astype({col: object for col in COMPACT_COLUMNS})
+        object_retained = tracemalloc.get_traced_memory()[0] - baseline
+        object_deep = frame_nbytes(combined)
+    finally:
+        tracemalloc.stop()
+
+    results = {'rows': len(combined)}
+    for measure, object_bytes, compact_bytes in (
+        ('retained', object_retained, compact_retained),
+        ('deep', object_deep, compact_deep),
+    ):
+        results[measure] = {
+            'object_bytes': object_bytes,
+            'compact_bytes': compact_bytes,
+            'saved_bytes': object_bytes - compact_bytes,
+            'saved_ratio': round(1 - compact_bytes / object_bytes, 4),
+        }
+        print(
+            f"{results['rows']} rows, {measure:<8}: {object_bytes / 1024 / 1024:7.1f} MiB as object strings, "
+            f"{compact_bytes / 1024 / 1024:7.1f} MiB compact ({results[measure]['saved_ratio']:.0%} saved)"
+        )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
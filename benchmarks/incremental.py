@@ -0,0 +1,83 @@
+"""Time to re-transform a revised test pack with and without incremental explode.
+
+    python -m benchmarks.incremental [--scripts 20000] [--changed 0.01]
+
+Generates one sheet and transforms it once in incremental mode so its test
+scripts are stored, then changes the step text of --changed of the scripts.
+The revision's first incremental transform reports how many blocks it
+reused. After that, the splitter's transform on the revision is timed both
+ways (best of --repeat). By then the changed blocks are stored too, so the
+incremental time is the cost of reusing every block.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.incremental', description="Measure incremental re-processing of a revised sheet.")
+    parser.add_argument('--scripts', type=int, default=20000)
+    parser.add_argument('--steps', type=int, default=12, help="Most steps per test script")
+    parser.add_argument('--changed', type=float, default=0.01, help="Share of test scripts changed in the revision")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.workbooks import write_workbook
+    from modules.cache import exploded_blocks
+    from modules.profiling import Profile
+    from modules.splitter import funding_transform
+    from modules.transform import incremental_explode
+    from modules.workbook import NamedBytesIO, WorkbookSession, read_test_sheet
+
+    source = io.BytesIO()
+    write_workbook(source, scripts=args.scripts, steps=args.steps)
+    with WorkbookSession(NamedBytesIO(source.getvalue(), 'incremental [funding].xlsx')) as workbook:
+        sheet = read_test_sheet(workbook, workbook.sheet_names[0])
+    revised = sheet.copy()
+    column = revised.columns.get_loc('EXECUTION SEQUENCE')
+    step = max(1, round(1 / args.changed)) if args.changed > 0 else len(revised) + 1
+    for row in range(0, len(revised), step):
+        revised.iat[row, column] = f"{revised.iat[row, column]}\n99. Revised step"
+
+    def transform(df, incremental):
+        with incremental_explode(incremental):
+            return funding_transform(df, 'EP-1', 'Feature', 'Squad')
+
+    exploded_blocks.clear()
+    transform(sheet, True)
+    profile = Profile()
+    with profile.activate():
+        transform(revised, True)
+    explode = next(span for span in profile.spans if span['name'] == 'explode')
+    results = {
+        'scripts': len(sheet),
+        'blocks': explode['blocks'],
+        'reused_blocks': explode['reused_blocks'],
+        'full_seconds': round(best_of(args.repeat, lambda: transform(revised, False)), 4),
+        'incremental_seconds': round(best_of(args.repeat, lambda: transform(revised, True)), 4),
+    }
+    print(
+        f"{results['scripts']} scripts, {results['reused_blocks']}/{results['blocks']} blocks reused: "
+        f"full {results['full_seconds']:.3f}s, incremental {results['incremental_seconds']:.3f}s"
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Peak memory and time of processing one large workbook, whole and in large-file mode.
+
+    python -m benchmarks.large_files [--scripts 100000] [--chunk-rows 20000] [--format CSV]
+
+Writes a workbook of --scripts test scripts to a temporary file, then builds
+the splitter's combined download from it once normally and once per
+--chunk-rows value in large-file mode. Each run happens in a fresh
+process, so its peak resident set size (ru_maxrss) is its own.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class _Job:
+    progress = 0
+
+    def update(self, progress, message=None):
+        self.progress = progress
+
+def run_once(path, download_format, chunk_rows):
+    """Process path into a download in this process and return its time and peak RSS."""
+    sys.path.insert(0, ROOT)
+    from modules import splitter
+    from modules.processing import COMBINED_SHEET, run_processing
+    from modules.workbook import spool_upload
+
+    started = time.perf_counter()
+    with open(path, 'rb') as source:
+        files = [spool_upload(source)]  # As an upload would be; named after path
+    artifact = run_processing(
+        _Job(), splitter.select_transform, files, 'auto', {path: ['Sheet1']}, ('EP-1', 'Feature', 'Squad', 'High'),
+        COMBINED_SHEET, download_format, None, False, splitter.OUTPUT_NAMES, chunk_rows=chunk_rows
+    )
+    seconds = time.perf_counter() - started
+    size = artifact.output.seek(0, os.SEEK_END)
+    artifact.close()
+    # ru_maxrss is in KiB on Linux
+    return {'seconds': round(seconds, 3), 'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 'output_bytes': size}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.large_files', description="Compare peak memory with and without large-file mode.")
+    parser.add_argument('--scripts', type=int, default=100000)
+    parser.add_argument('--steps', type=int, default=12, help="Most steps per test script")
+    parser.add_argument('--chunk-rows', type=int, nargs='+', default=[20000, 5000])
+    parser.add_argument('--format', default='CSV', help="Download format, as named on the pages")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    parser.add_argument('--run', help=argparse.SUPPRESS)  # Internal: process this workbook and print the result
+    args = parser.parse_args(argv)
+
+    if args.run:
+        chunk_rows = args.chunk_rows[0] or None
+        print(json.dumps(run_once(args.run, args.format, chunk_rows)))
+        return
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.workbooks import write_workbook
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'large [funding].xlsx')
+        write_workbook(path, scripts=args.scripts, steps=args.steps)
+        results = {'scripts': args.scripts, 'workbook_bytes': os.path.getsize(path), 'runs': {}}
+        for chunk_rows in [0] + args.chunk_rows:
+            command = [
+                sys.executable, '-m', 'benchmarks.large_files', '--run', path,
+                '--format', args.format, '--chunk-rows', str(chunk_rows),
+            ]
+            run = json.loads(subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout)
+            label = f"chunks of {chunk_rows}" if chunk_rows else "whole sheets"
+            results['runs'][label] = run
+            print(f"{label:<18} {run['seconds']:8.2f}s {run['peak_rss_bytes'] / 1024 / 1024:10.1f} MiB peak RSS")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
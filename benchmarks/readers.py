@@ -0,0 +1,75 @@
+"""Parse time of each installed Excel reader on a synthetic workbook.
+
+    python -m benchmarks.readers [--scripts 5000] [--sheets 2] [--repeat 3]
+
+For every reader the same generated workbook is opened and each sheet goes
+through read_test_sheet, the parse behind the splitter and converter pages,
+then the verifier's counting pass runs on the split output. Median wall time is reported.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples), 4)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.readers', description="Compare Excel reader backends.")
+    parser.add_argument('--scripts', type=int, default=5000, help="Test scripts per sheet")
+    parser.add_argument('--sheets', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per reader; the median is reported")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.workbooks import write_workbook
+    from modules.output import write_xlsx
+    from modules.splitter import funding_transform
+    from modules.verifier import verify_excel
+    from modules.workbook import NamedBytesIO, WorkbookSession, available_engines, read_test_sheet
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_workbook(os.path.join(tmp, 'readers.xlsx'), scripts=args.scripts, sheets=args.sheets)
+        with open(path, 'rb') as source:
+            data = source.read()
+
+    # The verifier checks split output, so give it one to read
+    with WorkbookSession(NamedBytesIO(data, 'readers.xlsx')) as workbook:
+        split = funding_transform(read_test_sheet(workbook, workbook.sheet_names[0]))
+    split_output = io.BytesIO()
+    write_xlsx([('Sheet1', split)], split_output)
+    split_data = split_output.getvalue()
+
+    def parse(engine):
+        with WorkbookSession(NamedBytesIO(data, 'readers.xlsx'), engine=engine) as workbook:
+            for sheet_name in workbook.sheet_names:
+                read_test_sheet(workbook, sheet_name)
+
+    def verify(engine):
+        verify_excel(NamedBytesIO(split_data, 'split.xlsx'), engine)
+
+    results = {}
+    for engine in available_engines():
+        results[engine] = {
+            'parse_seconds': timed(lambda: parse(engine), args.repeat),
+            'verify_seconds': timed(lambda: verify(engine), args.repeat),
+        }
+        print(f"{engine:<10} parse {results[engine]['parse_seconds']:8.3f} s   verify {results[engine]['verify_seconds']:8.3f} s")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Cold-start import time of the app shell and of each page.
+
+    python -m benchmarks.startup [--repeat 5] [--output startup.json]
+
+Every sample runs in a fresh interpreter: first `import main` (Streamlit and
+the page registry), then the selected page's module, which is what opening
+that page for the first time costs after a container start.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import importlib, json, time
+started = time.perf_counter()
+import main
+shell = time.perf_counter() - started
+started = time.perf_counter()
+importlib.import_module(main.PAGES[{page!r}][0])
+print(json.dumps({{'shell': shell, 'page': time.perf_counter() - started}}))
+"""
+
+def measure(page, repeat):
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(page=page)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        'shell_seconds': round(statistics.median(sample['shell'] for sample in samples), 4),
+        'page_seconds': round(statistics.median(sample['page'] for sample in samples), 4),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup', description="Measure cold-start import time per page.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per page; the median is reported")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from main import PAGES
+
+    results = {page: measure(page, args.repeat) for page in PAGES}
+    for page, timings in results.items():
+        print(f"{page:<12} shell {timings['shell_seconds'] * 1000:8.1f} ms   page {timings['page_seconds'] * 1000:8.1f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Wall time and peak memory per processing stage, checked against a baseline.
+
+    python -m benchmarks.suite [--scenario small wide] [--threshold 0.5]
+    python -m benchmarks.suite --update-baseline
+
+Every scenario generates a workbook (see benchmarks/workbooks.py) and runs
+it through the same stages as the app: parsing, the splitter's and the
+converter's process_sheet, the XLSX, CSV, Parquet and Arrow writers and
+verify_excel on the split output. Each stage is timed (best of --repeat
+runs, the least noisy statistic) and then run once more under tracemalloc
+for its peak Python allocation; memory held by native readers such as
+calamine is not seen.
+
+Results are compared with benchmarks/baseline.json and the exit status is 1
+when any stage got slower or hungrier by more than --threshold. Timings are
+machine-specific: refresh the baseline with --update-baseline on the machine
+that runs the check.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SCENARIOS = {
+    'small': {'file_name': 'small [funding].xlsx', 'scripts': 200, 'steps': 5, 'header_offset': 0, 'pad_columns': 0, 'sheets': 1},
+    'wide': {'file_name': 'wide [financing].xlsx', 'scripts': 500, 'steps': 12, 'header_offset': 6, 'pad_columns': 8, 'sheets': 3},
+    'large': {'file_name': 'large [funding].xlsx', 'scripts': 5000, 'steps': 8, 'header_offset': 3, 'pad_columns': 2, 'sheets': 2},
+}
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.1
+MIN_BYTES_DELTA = 1024 * 1024
+
+def measure(stage, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        stage()
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(samples), 4), 'peak_bytes': peak}
+
+def scenario_stages(data, file_name):
+    """Stage name -> zero-argument callable, all working on the workbook bytes."""
+    import pandas as pd
+    from modules import convert, splitter
+    from modules.cache import raw_sheets, transformed_sheets
+    from modules.output import write_arrow, write_csv, write_parquet, write_xlsx
+    from modules.verifier import verify_excel
+    from modules.workbook import NamedBytesIO, WorkbookSession, read_test_sheet
+
+    with WorkbookSession(NamedBytesIO(data, file_name)) as workbook:
+        sheet_names = workbook.sheet_names
+
+    def parse():
+        with WorkbookSession(NamedBytesIO(data, file_name)) as workbook:
+            return [read_test_sheet(workbook, sheet_name) for sheet_name in sheet_names]
+
+    def process(page):
+        # Start cold every time, the caches would otherwise turn this into a lookup
+        raw_sheets.clear()
+        transformed_sheets.clear()
+        with WorkbookSession(NamedBytesIO(data, file_name)) as workbook:
+            return [
+                (sheet_name, page.process_sheet(workbook, sheet_name, 'EP-1', 'Feature', 'Squad', 'High'))
+                for sheet_name in sheet_names
+            ]
+
+    split_sheets = process(splitter)
+    combined = pd.concat([df for _, df in split_sheets], ignore_index=True)
+    split_output = io.BytesIO()
+    write_xlsx(split_sheets, split_output)
+    split_data = split_output.getvalue()
+
+    return {
+        'parse': parse,
+        'split': lambda: process(splitter),
+        'convert': lambda: process(convert),
+        'write_xlsx': lambda: write_xlsx(split_sheets, io.BytesIO()),
+        'write_csv': lambda: write_csv(combined, io.BytesIO()),
+        'write_parquet': lambda: write_parquet(combined, io.BytesIO()),
+        'write_arrow': lambda: write_arrow(combined, io.BytesIO()),
+        'verify': lambda: verify_excel(NamedBytesIO(split_data, 'split.xlsx')),
+    }
+
+def run_scenario(name, repeat):
+    from benchmarks.workbooks import write_workbook
+
+    options = dict(SCENARIOS[name])
+    file_name = options.pop('file_name')
+    source = io.BytesIO()
+    write_workbook(source, **options)
+    stages = scenario_stages(source.getvalue(), file_name)
+    return {stage: measure(func, repeat) for stage, func in stages.items()}
+
+def regressions(results, baseline, threshold):
+    """(scenario, stage, metric, baseline value, current value) for each stage past the threshold."""
+    found = []
+    for scenario, stages in results.items():
+        for stage, metrics in stages.items():
+            expected = baseline.get(scenario, {}).get(stage)
+            if not expected:
+                continue
+            for metric, floor in (('seconds', MIN_SECONDS_DELTA), ('peak_bytes', MIN_BYTES_DELTA)):
+                before, after = expected[metric], metrics[metric]
+                if after > before * (1 + threshold) and after - before > floor:
+                    found.append((scenario, stage, metric, before, after))
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description="Benchmark the processing stages against a stored baseline.")
+    parser.add_argument('--scenario', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the fastest is reported")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Allowed slowdown or memory growth, as a fraction of the baseline")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the new baseline instead of comparing")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    results = {}
+    for name in args.scenario:
+        results[name] = run_scenario(name, args.repeat)
+        for stage, metrics in results[name].items():
+            print(f"{name:<8} {stage:<14} {metrics['seconds'] * 1000:10.1f} ms {metrics['peak_bytes'] / 1024 / 1024:10.1f} MiB peak")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 0
+    with open(args.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    found = regressions(results, baseline, args.threshold)
+    for scenario, stage, metric, before, after in found:
+        print(f"REGRESSION {scenario}/{stage} {metric}: {before} -> {after} ({after / before - 1:+.0%})")
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
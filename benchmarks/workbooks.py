@@ -0,0 +1,82 @@
+"""Synthetic test-script workbooks shaped like the ones uploaded to the app.
+
+    python -m benchmarks.workbooks "packs/Sprint 1 [funding].xlsx" --scripts 2000 --steps 8 --sheets 3
+
+Each sheet has a few title rows above the header, blank padding columns to
+the left of the twelve test-script columns, and one row per test script whose
+EXECUTION SEQUENCE / EXPECTED RESULT cells hold numbered, newline-separated
+steps.
+"""
+import argparse
+import random
+import xlsxwriter
+
+HEADER = [
+    'NO.',
+    'TEST SCRIPT NUMBER',
+    'TEST SCRIPT DESCRIPTION/SCENARIO',
+    'TEST OBJECT NAME',
+    'Scenario Type',
+    'GENERAL INFORMATION / SUMMARY OF THE TEST SCRIPT',
+    'PRE-REQUISITES',
+    'EXECUTION SEQUENCE',
+    'EXPECTED RESULT',
+    'Product / Akad',
+    'Feature',
+    'Assigned Tester'
+]
+
+def numbered_steps(prefix, count):
+    return '\n'.join(f"{step}. {prefix} {step}" for step in range(1, count + 1))
+
+def write_workbook(path, scripts=100, steps=5, header_offset=3, pad_columns=2, sheets=1, seed=0):
+    """Write a workbook of `sheets` sheets with `scripts` test scripts of up to `steps` steps each.
+
+    path can also be a binary file object. The funding/financing routing is
+    by file name, so pick one containing [funding] or [financing].
+    """
+    rnd = random.Random(seed)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        for sheet_number in range(1, sheets + 1):
+            worksheet = workbook.add_worksheet(f"Sheet{sheet_number}")
+            if header_offset:
+                worksheet.write(0, pad_columns, f"Test scripts, sheet {sheet_number}")
+            worksheet.write_row(header_offset, pad_columns, HEADER)
+            for script in range(scripts):
+                step_count = rnd.randint(1, steps)
+                worksheet.write_row(header_offset + 1 + script, pad_columns, [
+                    script + 1,
+                    f"TS-{sheet_number:02d}-{script + 1:05d}",
+                    f"Scenario {script + 1}",
+                    'Transfer',
+                    rnd.choice(['Positive', 'Negative']),
+                    f"Checks flow {script + 1}",
+                    'User is logged in',
+                    numbered_steps('Do step', step_count),
+                    numbered_steps('Expect result', step_count),
+                    'Tabungan',
+                    'Funding',
+                    'Tester',
+                ])
+    finally:
+        workbook.close()
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.workbooks', description="Generate a synthetic test-script workbook.")
+    parser.add_argument('path', help="Output .xlsx; include [funding] or [financing] in the name to pick the transform")
+    parser.add_argument('--scripts', type=int, default=100, help="Test scripts per sheet")
+    parser.add_argument('--steps', type=int, default=5, help="Most steps per test script")
+    parser.add_argument('--header-offset', type=int, default=3, help="Title rows above the header")
+    parser.add_argument('--pad-columns', type=int, default=2, help="Blank columns left of the test-script columns")
+    parser.add_argument('--sheets', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_workbook(
+        args.path, scripts=args.scripts, steps=args.steps, header_offset=args.header_offset,
+        pad_columns=args.pad_columns, sheets=args.sheets, seed=args.seed
+    )
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,19 @@
+import importlib
 import streamlit as st
-from modules.homepage import render_home_page
-from modules.splitter import render_splitter
-from modules.verifier import render_verifier
-from modules.convert import render_convert
+
+# Page name -> (module, render function). Page modules are imported on first
+# use only, so opening Home doesn't pay for pandas, openpyxl, etc.
+PAGES = {
+    "Home": ("modules.homepage", "render_home_page"),
+    "Splitter": ("modules.splitter", "render_splitter"),
+    "Verifier": ("modules.verifier", "render_verifier"),
+    "Converter": ("modules.convert", "render_convert"),
+}
+
+def render_page(choice):
+    module_name, render_name = PAGES[choice]
+    render = getattr(importlib.import_module(module_name), render_name)
+    render()
 
 def set_page_config():
     """Set the Streamlit page configuration."""
@@ -20,17 +31,9 @@ def set_page_config():
 def main():
     try:
         set_page_config()
-        menu = ["Home", "Splitter", "Verifier", "Converter"]
+        menu = list(PAGES)
         choice = st.sidebar.selectbox("Main Menu", menu)
-    
-        if choice == "Home":
-            render_home_page()
-        elif choice == "Splitter":
-            render_splitter()
-        elif choice == "Verifier":
-            render_verifier()
-        elif choice == "Converter":
-            render_convert()
+        render_page(choice)
     except Exception:
         print("temporary down")
 
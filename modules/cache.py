@@ -0,0 +1,157 @@
+import threading
+from cachetools import LRUCache
+from modules.profiling import span
+from modules.workbook import read_test_sheet
+
+# Budgets are shared by every session served by this process
+RAW_SHEET_CACHE_BYTES = 512 * 1024 * 1024
+RESULT_CACHE_BYTES = 512 * 1024 * 1024
+EXPLODED_BLOCK_CACHE_BYTES = 256 * 1024 * 1024
+BLOCK_SAMPLE_ROWS = 1000
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class FrameCache:
+    """Thread-safe LRU of DataFrames, bounded by their total in-memory size."""
+
+    def __init__(self, max_bytes):
+        self._frames = LRUCache(maxsize=max_bytes, getsizeof=frame_nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            df = self._frames.get(key)
+        # Hand out copies so callers can't modify the cached frame
+        return None if df is None else df.copy()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def put(self, key, df):
+        with self._lock:
+            try:
+                self._frames[key] = df
+            except ValueError:
+                pass  # Larger than the whole budget, not worth evicting everything for
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+class _Batches(LRUCache):
+    def __init__(self, maxsize, getsizeof, on_evict):
+        super().__init__(maxsize=maxsize, getsizeof=getsizeof)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+class ExplodedBlocks:
+    """Thread-safe store of exploded test-script blocks, found by block fingerprint.
+
+    Blocks exploded together are kept together as one frame (a batch),
+    along with each block's fingerprint and row range, so reusing many
+    blocks costs one take per batch instead of one copy per block. Batches
+    are evicted whole, least recently used first, once their total size
+    passes max_bytes. Callers only read the frames, so they aren't copied.
+    """
+
+    def __init__(self, max_bytes):
+        self._batches = _Batches(max_bytes, lambda batch: batch[0], self._forget)
+        self._index = {}  # fingerprint -> (batch ID, start row, end row)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _forget(self, batch_id, batch):
+        for fingerprint in batch[2]:
+            if self._index.get(fingerprint, (None,))[0] == batch_id:
+                del self._index[fingerprint]
+
+    def find(self, fingerprints):
+        """(frame, start, end) for each fingerprint, or None for the ones not stored."""
+        with self._lock:
+            locations = [self._index.get(fingerprint) for fingerprint in fingerprints]
+            frames = {}
+            for batch_id in {location[0] for location in locations if location is not None}:
+                batch = self._batches.get(batch_id)  # Once per batch, which also marks it used
+                frames[batch_id] = None if batch is None else batch[1]
+        return [
+            None if location is None or frames[location[0]] is None else (frames[location[0]], location[1], location[2])
+            for location in locations
+        ]
+
+    def add(self, fingerprints, bounds, frame):
+        """Store frame, whose rows bounds[i]:bounds[i + 1] are the block with fingerprints[i]."""
+        # Estimated from a sample of rows, measuring every string would cost as much as the explode
+        step = max(1, len(frame) // BLOCK_SAMPLE_ROWS)
+        nbytes = frame_nbytes(frame.iloc[::step]) * step
+        with self._lock:
+            batch_id = self._next_id
+            self._next_id += 1
+            try:
+                self._batches[batch_id] = (nbytes, frame, fingerprints)
+            except ValueError:
+                return  # Larger than the whole budget
+            for number, fingerprint in enumerate(fingerprints):
+                self._index[fingerprint] = (batch_id, bounds[number], bounds[number + 1])
+
+    def clear(self):
+        with self._lock:
+            self._batches.clear()
+            self._index.clear()
+
+raw_sheets = FrameCache(RAW_SHEET_CACHE_BYTES)
+transformed_sheets = FrameCache(RESULT_CACHE_BYTES)
+exploded_blocks = ExplodedBlocks(EXPLODED_BLOCK_CACHE_BYTES)
+
+def transform_kind(transform):
+    return f"{transform.__module__}.{transform.__qualname__}"
+
+def sheet_keys(workbook, sheet_name, transform, params):
+    sheet_key = (workbook.digest, workbook.engine, sheet_name, transform_kind(transform))
+    return sheet_key, sheet_key + tuple(params)
+
+def lookup_result(workbook, sheet_name, transform, *params):
+    """Return the cached transform result for a sheet, or None."""
+    return transformed_sheets.get(sheet_keys(workbook, sheet_name, transform, params)[1])
+
+def has_raw_sheet(workbook, sheet_name, transform):
+    """Whether the parsed sheet is cached, so only the transform has to run."""
+    return sheet_keys(workbook, sheet_name, transform, ())[0] in raw_sheets
+
+def store_raw_sheet(workbook, sheet_name, transform, raw):
+    raw_sheets.put(sheet_keys(workbook, sheet_name, transform, ())[0], raw)
+
+def store_result(workbook, sheet_name, transform, params, df):
+    transformed_sheets.put(sheet_keys(workbook, sheet_name, transform, params)[1], df.copy())
+
+def cached_sheet(workbook, sheet_name, transform, epic_link, feature, squad, priority):
+    """Run transform on a workbook sheet, reusing parsed sheets and results across reruns.
+
+    Parsed sheets are keyed on (file digest, reader, sheet name, transform kind) and
+    transformed frames additionally on the form parameters, so changing only
+    the Epic Link re-runs the transform but not the parse.
+    """
+    params = (epic_link, feature, squad, priority)
+    sheet_key, result_key = sheet_keys(workbook, sheet_name, transform, params)
+    with span('result_cache', hit=False) as counters:
+        df = transformed_sheets.get(result_key)
+        counters['hit'] = df is not None
+    if df is not None:
+        return df
+
+    with span('sheet_cache', hit=False) as counters:
+        raw = raw_sheets.get(sheet_key)
+        counters['hit'] = raw is not None
+    if raw is None:
+        raw = read_test_sheet(workbook, sheet_name)
+        raw_sheets.put(sheet_key, raw.copy())
+    with span('transform', rows_in=len(raw)) as counters:
+        df = transform(raw, *params)
+        counters['rows'] = len(df)
+    transformed_sheets.put(result_key, df.copy())
+    return df
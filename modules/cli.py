@@ -0,0 +1,141 @@
+"""Headless batch processing, without Streamlit.
+
+    python -m modules.cli --in packs/ --out out/ --mode split --workers 8
+
+Every sheet of every input workbook goes through the splitter's or the
+converter's transform. Results are written to --out, one workbook per input
+(or, with --format csv/parquet/arrow, a folder with one file per sheet), and
+a JSON summary of row counts and timings is printed (or written to --summary).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modules import convert, splitter
+from modules.output import COMPRESSIONS, DOWNLOAD_FORMATS, drain, write_frame, write_xlsx
+from modules.workbook import READER_ENGINES, WorkbookSession, read_test_sheet, resolve_engine
+
+PAGES = {'split': splitter, 'convert': convert}
+
+def find_workbooks(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            yield from (
+                os.path.join(path, name) for name in names
+                if name.lower().endswith('.xlsx') and not name.startswith('~$')  # Skip Excel lock files
+            )
+        else:
+            yield path
+
+def process_workbook(path, out_dir, mode, file_format, params, engine='auto', compression=None):
+    """Transform every sheet of one workbook, write the results and return its summary."""
+    started = time.perf_counter()
+    name = os.path.basename(path)
+    stem = os.path.splitext(name)[0]
+    transform = PAGES[mode].select_transform(name)
+    summary = {'input': path, 'sheets': []}
+    try:
+        processed_data = []
+        with open(path, 'rb') as source, WorkbookSession(source, name, engine) as workbook:
+            for sheet_name in workbook.sheet_names:
+                sheet_started = time.perf_counter()
+                try:
+                    df = transform(read_test_sheet(workbook, sheet_name), *params)
+                except ValueError as e:
+                    # Cover pages, lookups etc. have no test-script header
+                    summary['sheets'].append({'sheet': sheet_name, 'skipped': str(e)})
+                    continue
+                processed_data.append((sheet_name, df))
+                summary['sheets'].append({
+                    'sheet': sheet_name,
+                    'rows': len(df),
+                    'seconds': round(time.perf_counter() - sheet_started, 4),
+                })
+
+        write_started = time.perf_counter()
+        if file_format == 'xlsx':
+            output_path = os.path.join(out_dir, f"{stem}.xlsx")
+            with open(output_path, 'wb') as output:
+                write_xlsx(drain(processed_data), output)
+        else:
+            output_path = os.path.join(out_dir, stem)
+            os.makedirs(output_path, exist_ok=True)
+            for sheet_name, df in drain(processed_data):
+                with open(os.path.join(output_path, f"{sheet_name}.{file_format}"), 'wb') as output:
+                    write_frame(df, output, file_format, compression)
+        summary['output'] = output_path
+        summary['write_seconds'] = round(time.perf_counter() - write_started, 4)
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+    summary['rows'] = sum(sheet.get('rows', 0) for sheet in summary['sheets'])
+    summary['seconds'] = round(time.perf_counter() - started, 4)
+    return summary
+
+def run_batch(paths, out_dir, mode, file_format, params, workers=1, engine='auto', compression=None):
+    """Process workbooks, in parallel when workers > 1, and return their summaries in input order."""
+    if workers <= 1 or len(paths) <= 1:
+        return [process_workbook(path, out_dir, mode, file_format, params, engine, compression) for path in paths]
+
+    summaries = [None] * len(paths)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = {
+            pool.submit(process_workbook, path, out_dir, mode, file_format, params, engine, compression): index
+            for index, path in enumerate(paths)
+        }
+        for future in as_completed(futures):
+            summaries[futures[future]] = future.result()
+    return summaries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m modules.cli', description="Split or convert test-script workbooks without the web UI.")
+    parser.add_argument('--in', dest='inputs', nargs='+', required=True, help="Workbooks, or directories of .xlsx files")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--mode', choices=sorted(PAGES), default='split')
+    parser.add_argument('--format', dest='file_format', choices=[key for key, _, _ in DOWNLOAD_FORMATS.values()], default='xlsx')
+    parser.add_argument('--compression', help="Parquet: snappy (default), zstd, gzip or none; Arrow: lz4 (default), zstd or uncompressed")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--engine', choices=['auto'] + list(READER_ENGINES), default='auto', help="Excel reader; 'auto' prefers calamine when installed")
+    parser.add_argument('--epic-link', default='')
+    parser.add_argument('--feature', default='')
+    parser.add_argument('--squad', default='')
+    parser.add_argument('--priority', default='High')
+    parser.add_argument('--summary', help="Write the JSON summary to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    paths = list(find_workbooks(args.inputs))
+    params = (args.epic_link, args.feature, args.squad, args.priority)
+    try:
+        engine = resolve_engine(args.engine)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.compression is not None and args.compression not in COMPRESSIONS.get(args.file_format, []):
+        parser.error(f"--compression {args.compression} does not apply to --format {args.file_format}")
+    files = run_batch(
+        paths, args.out, args.mode, args.file_format, params,
+        workers=args.workers, engine=engine, compression=args.compression
+    )
+    report = {
+        'mode': args.mode,
+        'format': args.file_format,
+        'workers': args.workers,
+        'engine': engine,
+        'files': files,
+        'rows': sum(summary['rows'] for summary in files),
+        'failed': sum('error' in summary for summary in files),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as summary_file:
+            json.dump(report, summary_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 1 if report['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs running at once across every session served by this process; later
+# submissions wait in order for a free slot, so one large upload can't take
+# the whole server. Jobs sharing a group (one run's downloads) also run one
+# at a time, so one user can't take every slot either
+MAX_RUNNING_JOBS = 2
+JOB_TTL_SECONDS = 60 * 60  # Finished jobs (and their outputs) are dropped after this
+POLL_SECONDS = 1
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """A function running on the job pool, and the progress it has reported.
+
+    The function receives the job as its first argument and calls
+    update(progress, message) as it goes; update raises JobCancelled once the
+    job has been cancelled, which stops it at its next report. Its return
+    value becomes result, and an exception it raises becomes error.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.progress = 0
+        self.message = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.finished = None
+        self._cancelled = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def update(self, progress, message=None):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.progress = progress
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.status == QUEUED:
+            # Never started, so nothing will report the cancellation
+            self.status = CANCELLED
+            self.finished = time.monotonic()
+
+    def close(self):
+        """Release the result's resources (e.g. its spooled output file), if it has any."""
+        close = getattr(self.result, 'close', None)
+        if close is not None:
+            close()
+
+    def _run(self, func, args):
+        try:
+            if self._cancelled.is_set():
+                raise JobCancelled()
+            self.status = RUNNING
+            self.message = "Starting..."
+            self.result = func(self, *args)
+            self.status = DONE
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        finally:
+            self.finished = time.monotonic()
+            if self.status != DONE or self._cancelled.is_set():
+                self.close()
+
+_jobs = {}
+_groups = {}  # group with a job on the pool -> (job, func, args) waiting for it to finish
+_lock = threading.Lock()
+_pool = None
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix='job')
+        return _pool
+
+def submit(func, *args, group=None):
+    """Queue func(job, *args) on the job pool and return the job's ID.
+
+    A job with a group is only handed to the pool once every job submitted
+    before it with the same group has finished.
+    """
+    expire_jobs()
+    job = Job()
+    with _lock:
+        _jobs[job.id] = job
+        if group is not None:
+            if group in _groups:
+                _groups[group].append((job, func, args))
+                return job.id
+            _groups[group] = deque()
+    _executor().submit(_run_in_group, job, func, args, group)
+    return job.id
+
+def _run_in_group(job, func, args, group):
+    try:
+        job._run(func, args)
+    finally:
+        if group is not None:
+            with _lock:
+                waiting = _groups[group]
+                while waiting and waiting[0][0].done:
+                    waiting.popleft()  # Cancelled while waiting
+                if waiting:
+                    job, func, args = waiting.popleft()
+                else:
+                    del _groups[group]
+                    job = None
+            if job is not None:
+                _executor().submit(_run_in_group, job, func, args, group)
+
+def get_job(job_id):
+    """The job with this ID, or None if it never existed or has expired."""
+    expire_jobs()
+    with _lock:
+        return _jobs.get(job_id)
+
+def queue_position(job):
+    """Number of jobs submitted before job that are still waiting for a worker."""
+    with _lock:
+        return sum(1 for other in _jobs.values() if other.status == QUEUED and other.submitted < job.submitted)
+
+def discard_job(job_id):
+    """Cancel the job if it is still going and forget it; its result is released once it stops."""
+    with _lock:
+        job = _jobs.pop(job_id, None)
+    if job is not None:
+        job.cancel()
+        if job.done:
+            job.close()
+
+def expire_jobs():
+    now = time.monotonic()
+    with _lock:
+        expired = [job_id for job_id, job in _jobs.items() if job.done and now - job.finished > JOB_TTL_SECONDS]
+        jobs = [_jobs.pop(job_id) for job_id in expired]
+    for job in jobs:
+        job.close()
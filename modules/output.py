@@ -0,0 +1,375 @@
+import contextvars
+import io
+import math
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import xlsxwriter
+from modules.profiling import span
+
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # Outputs larger than this are spooled to disk
+EXCEL_SHEET_NAME_LIMIT = 31
+# Header row included
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMNS = 16384
+CSV_CHUNK_ROWS = 10000
+ZIP_WORKERS = min(4, os.cpu_count() or 1)
+# Download format label -> (format key, file extension, MIME type)
+DOWNLOAD_FORMATS = {
+    'XLSX': ('xlsx', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'csv', 'text/csv'),
+    'Parquet': ('parquet', 'parquet', 'application/vnd.apache.parquet'),
+    'Arrow IPC (Feather)': ('arrow', 'arrow', 'application/vnd.apache.arrow.file'),
+}
+# First entry is the default
+COMPRESSIONS = {
+    'parquet': ['snappy', 'zstd', 'gzip', 'none'],
+    'arrow': ['lz4', 'zstd', 'uncompressed'],
+}
+# Members in these formats are compressed already, so zip stores them as-is
+PRECOMPRESSED_FORMATS = {'xlsx', 'parquet', 'arrow'}
+
+def open_output():
+    """Temporary file for a generated download; small outputs stay in memory, large ones go to disk."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+def download_data(output):
+    """Contents of a finished output (spooled or a regular file) as bytes, for st.download_button.
+
+    Streamlit copies whatever it is given into its in-memory media store on
+    every rerun that shows the button, whatever the type, so a shown
+    download always costs its full size in RAM. The output is read at
+    explicit offsets rather than through its file position, so reruns
+    showing it at the same time can't interfere, and a small output still
+    held in memory is returned without being moved to disk.
+    """
+    if isinstance(output, tempfile.SpooledTemporaryFile) and not output._rolled:
+        return output._file.getvalue()
+    fd = output.fileno()
+    size = os.fstat(fd).st_size
+    chunks = []
+    offset = 0
+    while offset < size:
+        chunk = os.pread(fd, size - offset, offset)  # May return less than asked for
+        if not chunk:
+            break
+        chunks.append(chunk)
+        offset += len(chunk)
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+def drain(processed_data):
+    """Yield (sheet_name, df) pairs, removing each from processed_data so it can be freed once written."""
+    while processed_data:
+        yield processed_data.pop(0)
+
+def _excel_value(value):
+    if value is None or value is pd.NaT or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _position(stream):
+    try:
+        return stream.tell()
+    except (AttributeError, OSError):
+        return None  # Zip entries and pipes can't tell
+
+def _written_bytes(stream, start):
+    end = _position(stream)
+    return None if start is None or end is None else end - start
+
+def unique_sheet_name(sheet_name, used_names):
+    safe_sheet_name = str(sheet_name)[:EXCEL_SHEET_NAME_LIMIT]  # Excel sheet name limit
+    suffix = 1
+    while safe_sheet_name.lower() in used_names:
+        suffix += 1
+        tag = f" ({suffix})"
+        safe_sheet_name = str(sheet_name)[:EXCEL_SHEET_NAME_LIMIT - len(tag)] + tag
+    used_names.add(safe_sheet_name.lower())
+    return safe_sheet_name
+
+def _open_xlsx(output):
+    """A constant_memory xlsxwriter Workbook on output and its header cell format."""
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'tmpdir': tempfile.gettempdir(),
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    return workbook, workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+def _check_sheet_size(rows, columns):
+    """Raise ValueError, as DataFrame.to_excel does, if rows data rows and a header don't fit in a worksheet.
+
+    xlsxwriter doesn't raise for cells past the limits, it skips them.
+    """
+    if rows + 1 > EXCEL_MAX_ROWS or columns > EXCEL_MAX_COLUMNS:
+        raise ValueError(
+            f"This sheet is too large! Your sheet size is: {rows}, {columns} "
+            f"Max sheet size is: {EXCEL_MAX_ROWS - 1}, {EXCEL_MAX_COLUMNS}"
+        )
+
+def _write_rows(worksheet, df, first_row):
+    for row_index, row in enumerate(df.itertuples(index=False, name=None), start=first_row):
+        for col_index, value in enumerate(row):
+            value = _excel_value(value)
+            if value is not None:
+                worksheet.write(row_index, col_index, value)
+
+def _frames(df):
+    """The frames a sheet is written from: df itself, or the frames of a sheet read in chunks."""
+    return [df] if isinstance(df, pd.DataFrame) else df
+
+def write_xlsx(sheets, output):
+    """Write (sheet_name, df) pairs to output as an XLSX workbook, row by row.
+
+    Uses xlsxwriter's constant_memory mode, so each row is flushed to disk as
+    soon as it is written and only the current row is held by the writer.
+    Cells are written like DataFrame.to_excel(index=False): a bold, bordered
+    header row and blank cells for missing values. df may also be an
+    iterable of frames, written one after another under the first's header.
+    Raises ValueError for a sheet past Excel's size limits (see _check_sheet_size).
+    """
+    start = _position(output)
+    with span('write_xlsx', sheets=0, rows=0) as counters:
+        workbook, header_format = _open_xlsx(output)
+        used_names = set()
+        for sheet_name, frames in sheets:
+            worksheet = workbook.add_worksheet(unique_sheet_name(sheet_name, used_names))
+            rows = 0
+            for df in _frames(frames):
+                _check_sheet_size(rows + len(df), len(df.columns))
+                if rows == 0:
+                    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+                _write_rows(worksheet, df, rows + 1)
+                rows += len(df)
+            counters['sheets'] += 1
+            counters['rows'] += rows
+        workbook.close()
+        counters['bytes'] = _written_bytes(output, start)
+
+def write_csv(df, stream, header=True):
+    """Write df as UTF-8 CSV to a binary stream, encoding CSV_CHUNK_ROWS rows at a time."""
+    start = _position(stream)
+    with span('write_csv', rows=len(df)) as counters:
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        try:
+            df.to_csv(text, index=False, header=header, chunksize=CSV_CHUNK_ROWS)
+        finally:
+            text.flush()
+            text.detach()
+        counters['bytes'] = _written_bytes(stream, start)
+
+def _arrow_cell(value):
+    if value is None or isinstance(value, str) or (isinstance(value, float) and math.isnan(value)):
+        return value
+    return str(value)
+
+def arrow_table(df):
+    """df as a pyarrow Table without its index.
+
+    Sheets read without a header can mix numbers and text in one column,
+    which Arrow can't store; such columns are written as text, the way they
+    would read back from the CSV output.
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = {
+            col: df[col].astype(object).map(_arrow_cell)
+            for col in df.columns
+            if df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)
+        }
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+def write_parquet(df, stream, compression='snappy'):
+    start = _position(stream)
+    with span('write_parquet', rows=len(df), compression=compression) as counters:
+        pq.write_table(arrow_table(df), stream, compression=compression)
+        counters['bytes'] = _written_bytes(stream, start)
+
+def write_arrow(df, stream, compression='lz4'):
+    """Write df as an Arrow IPC file (Feather v2)."""
+    start = _position(stream)
+    with span('write_arrow', rows=len(df), compression=compression) as counters:
+        feather.write_feather(arrow_table(df), stream, compression=compression)
+        counters['bytes'] = _written_bytes(stream, start)
+
+def write_frame(df, stream, file_format, compression=None):
+    """Write one frame as csv, parquet or arrow; compression=None picks the format's default."""
+    if file_format == 'csv':
+        write_csv(df, stream)
+    elif file_format == 'parquet':
+        write_parquet(df, stream, compression or COMPRESSIONS['parquet'][0])
+    elif file_format == 'arrow':
+        write_arrow(df, stream, compression or COMPRESSIONS['arrow'][0])
+    else:
+        raise ValueError(f"Unknown output format '{file_format}'")
+
+def _stream_schema(table):
+    """Schema every appended table is cast to.
+
+    Categoricals become plain values, since each sheet brings its own
+    dictionary, and all-empty columns become text so a later sheet with
+    values in them still fits.
+    """
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+class CombinedWriter:
+    """Append frames one after another to a single output sheet/file.
+
+    Backs the "one combined sheet" output: each sheet's frame is written as
+    soon as it is ready instead of being concatenated first, so only the
+    frame being appended is held in memory. XLSX rows continue down one
+    constant_memory worksheet, CSV rows are appended after a single header,
+    and Parquet/Arrow frames become row groups/record batches of one file.
+    Columns follow the first frame; later frames are aligned to them.
+    An XLSX append that would take the sheet past Excel's size limits
+    raises ValueError before anything of it is written.
+    """
+
+    def __init__(self, output, file_format, compression=None, sheet_name='Combined_Sheet'):
+        if file_format not in ('xlsx', 'csv', 'parquet', 'arrow'):
+            raise ValueError(f"Unknown output format '{file_format}'")
+        self.output = output
+        self.file_format = file_format
+        self.compression = compression or COMPRESSIONS.get(file_format, [None])[0]
+        self.sheet_name = sheet_name
+        self.columns = None
+        self.frames = 0
+        self.rows = 0
+        self._start = _position(output)
+        self._workbook = None
+        self._worksheet = None
+        self._schema = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self._open(df)
+        elif list(df.columns) != self.columns:
+            df = df.reindex(columns=self.columns)
+        with span('append', format=self.file_format, rows=len(df)):
+            if self.file_format == 'xlsx':
+                _check_sheet_size(self.rows + len(df), len(df.columns))
+                _write_rows(self._worksheet, df, self.rows + 1)
+            elif self.file_format == 'csv':
+                write_csv(df, self.output, header=self.frames == 0)
+            else:
+                self._writer.write_table(arrow_table(df).cast(self._schema))
+        self.frames += 1
+        self.rows += len(df)
+
+    def _open(self, df):
+        if self.file_format == 'xlsx':
+            self._workbook, header_format = _open_xlsx(self.output)
+            self._worksheet = self._workbook.add_worksheet(unique_sheet_name(self.sheet_name, set()))
+            self._worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+        elif self.file_format in ('parquet', 'arrow'):
+            self._schema = _stream_schema(arrow_table(df.head(0))).remove_metadata()
+            if self.file_format == 'parquet':
+                self._writer = pq.ParquetWriter(self.output, self._schema, compression=self.compression)
+            else:
+                compression = None if self.compression == 'uncompressed' else self.compression
+                self._writer = pa.ipc.new_file(
+                    self.output, self._schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+                )
+
+    def close(self):
+        """Finish the output; raises ValueError if nothing was appended."""
+        if self.columns is None:
+            raise ValueError("No sheets to combine")
+        with span('close_combined', format=self.file_format, rows=self.rows) as counters:
+            if self._workbook is not None:
+                self._workbook.close()
+            elif self._writer is not None:
+                self._writer.close()
+            counters['bytes'] = _written_bytes(self.output, self._start)
+
+def _write_member(sheet_name, df, file_format, stream, compression=None):
+    if file_format == 'xlsx':
+        write_xlsx([(sheet_name, df)], stream)
+    elif isinstance(df, pd.DataFrame):
+        write_frame(df, stream, file_format, compression)
+    else:
+        with CombinedWriter(stream, file_format, compression) as writer:
+            for frame in df:
+                writer.append(frame)
+
+def _render_member(sheet_name, df, file_format, compression=None):
+    member = open_output()
+    _write_member(sheet_name, df, file_format, member, compression)
+    member.seek(0)
+    return member
+
+def unique_member_name(sheet_name, file_format, used_names):
+    member_name = f"{sheet_name}.{file_format}"
+    suffix = 1
+    while member_name in used_names:
+        suffix += 1
+        member_name = f"{sheet_name} ({suffix}).{file_format}"
+    used_names.add(member_name)
+    return member_name
+
+def write_zip(sheets, output, file_format, workers=1, compression=None):
+    """Write each (sheet_name, df) as a <sheet_name>.<file_format> member of a ZIP archive.
+
+    CSV members are encoded straight into their deflated zip entry, one at
+    a time. XLSX, Parquet and Arrow members are compressed already, so they
+    are stored as-is; ZipFile only accepts one open entry at a time, so
+    with workers > 1 those are rendered (and compressed) in threads into
+    spooled temp files, then copied into the archive in order. df may also
+    be an iterable of frames (see write_xlsx); with workers=1 those are
+    consumed one sheet at a time.
+    """
+    compress_type = zipfile.ZIP_STORED if file_format in PRECOMPRESSED_FORMATS else zipfile.ZIP_DEFLATED
+    if file_format not in PRECOMPRESSED_FORMATS:
+        workers = 1
+    used_names = set()
+    start = _position(output)
+    with span('write_zip', format=file_format, workers=workers) as counters:
+        with zipfile.ZipFile(output, 'w', compress_type) as zip_file:
+            if workers <= 1:
+                for sheet_name, df in sheets:
+                    with zip_file.open(unique_member_name(sheet_name, file_format, used_names), 'w', force_zip64=True) as entry:
+                        _write_member(sheet_name, df, file_format, entry, compression)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    # Threads don't inherit context variables; each member gets a copy so
+                    # its spans reach the active profile, under this write_zip span
+                    futures = [
+                        (sheet_name, pool.submit(
+                            contextvars.copy_context().run, _render_member, sheet_name, df, file_format, compression
+                        ))
+                        for sheet_name, df in sheets
+                    ]
+                    for sheet_name, future in futures:
+                        with future.result() as member:
+                            with zip_file.open(unique_member_name(sheet_name, file_format, used_names), 'w', force_zip64=True) as entry:
+                                shutil.copyfileobj(member, entry)
+        counters['members'] = len(used_names)
+        counters['bytes'] = _written_bytes(output, start)
@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modules.cache import cached_sheet, has_raw_sheet, lookup_result, store_raw_sheet, store_result
+from modules.jobs import MAX_RUNNING_JOBS
+from modules.profiling import Profile, record_spans, sheet_scope, span
+from modules.workbook import NamedBytesIO, WorkbookSession, read_test_sheet
+
+# Below these a pool costs more to start than the sheets take to process
+PARALLEL_MIN_TASKS = 3
+PARALLEL_MIN_BYTES = 1024 * 1024
+MAX_WORKERS = os.cpu_count() or 1
+# Sheet pools run inside jobs; each running job gets its share of the CPUs
+SHEET_WORKERS = max(1, MAX_WORKERS // MAX_RUNNING_JOBS)
+
+def _transform_sheet(transform, file_name, data, sheet_name, params, engine):
+    # Runs in a worker process, which only ever sees plain bytes; the parsed
+    # sheet and the spans travel back with the result for the parent's caches
+    profile = Profile()
+    with profile.activate(), sheet_scope(file_name, sheet_name):
+        with WorkbookSession(NamedBytesIO(data, file_name), engine=engine) as workbook:
+            raw = read_test_sheet(workbook, sheet_name)
+        with span('transform', rows_in=len(raw), worker=os.getpid()) as counters:
+            df = transform(raw, *params)
+            counters['rows'] = len(df)
+    return raw, df, profile.spans
+
+def iter_in_processes(func, tasks, workers):
+    """Run func(*args) for every args tuple in tasks on a process pool.
+
+    Yields (index, result) pairs in completion order. Remaining tasks are
+    cancelled if one fails or the caller stops iterating.
+    """
+    # spawn: forking a threaded Streamlit server is not safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(func, *args): index for index, args in enumerate(tasks)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+
+def run_in_processes(func, tasks, workers, on_result=None):
+    """Run func(*args) for every args tuple in tasks on a process pool.
+
+    Results are returned in task order; on_result(index, result) is called in
+    the parent process as each task completes. Remaining tasks are cancelled
+    if one fails.
+    """
+    results = [None] * len(tasks)
+    for index, result in iter_in_processes(func, tasks, workers):
+        results[index] = result
+        if on_result:
+            on_result(index, result)
+    return results
+
+def iter_sheets(select_transform, workbooks, units, params, parallel=True, on_progress=None):
+    """Process (file_name, sheet_name) units, yielding (index, df) in unit order.
+
+    select_transform maps a file name to the page's transform and workbooks
+    maps file names to open WorkbookSessions. Results already cached are
+    reused and sheets already parsed are only transformed, in this process;
+    the rest run serially or, for larger jobs, on a process pool.
+    Each frame is yielded as soon as it and every unit before it are done,
+    so the caller can write it out and drop it before later units finish.
+    on_progress(done, total, file_name, sheet_name) is called as each unit
+    finishes, in completion order.
+    """
+    total = len(units)
+    ready = {}  # Finished frames waiting for an earlier unit
+    next_index = 0
+    done = 0
+    pending = []
+
+    def finish(index, df):
+        nonlocal done
+        ready[index] = df
+        done += 1
+        if on_progress:
+            file_name, sheet_name = units[index]
+            on_progress(done, total, file_name, sheet_name)
+
+    def flush():
+        nonlocal next_index
+        while next_index in ready:
+            yield next_index, ready.pop(next_index)
+            next_index += 1
+
+    for index, (file_name, sheet_name) in enumerate(units):
+        transform = select_transform(file_name)
+        with sheet_scope(file_name, sheet_name), span('result_cache', hit=False) as counters:
+            df = lookup_result(workbooks[file_name], sheet_name, transform, *params)
+            counters['hit'] = df is not None
+        if df is None:
+            pending.append(index)
+        else:
+            finish(index, df)
+
+    if parallel:
+        # Parsing is what the pool is for; a sheet already parsed only needs its transform
+        parsed = [
+            index for index in pending
+            if has_raw_sheet(workbooks[units[index][0]], units[index][1], select_transform(units[index][0]))
+        ]
+        for index in parsed:
+            pending.remove(index)
+            yield from flush()
+            file_name, sheet_name = units[index]
+            with sheet_scope(file_name, sheet_name):
+                finish(index, cached_sheet(workbooks[file_name], sheet_name, select_transform(file_name), *params))
+
+    pending_files = {units[index][0] for index in pending}
+    pending_bytes = sum(workbooks[file_name].size for file_name in pending_files)
+    workers = min(SHEET_WORKERS, len(pending))
+    if not parallel or workers < 2 or len(pending) < PARALLEL_MIN_TASKS or pending_bytes < PARALLEL_MIN_BYTES:
+        for index in pending:
+            yield from flush()
+            file_name, sheet_name = units[index]
+            with sheet_scope(file_name, sheet_name):
+                finish(index, cached_sheet(workbooks[file_name], sheet_name, select_transform(file_name), *params))
+        yield from flush()
+        return
+
+    file_data = {file_name: workbooks[file_name].read_bytes() for file_name in pending_files}
+    tasks = []
+    for index in pending:
+        file_name, sheet_name = units[index]
+        tasks.append((
+            select_transform(file_name), file_name, file_data[file_name], sheet_name, params, workbooks[file_name].engine
+        ))
+
+    yield from flush()
+    for task_index, (raw, df, spans) in iter_in_processes(_transform_sheet, tasks, workers):
+        index = pending[task_index]
+        file_name, sheet_name = units[index]
+        record_spans(spans)
+        store_raw_sheet(workbooks[file_name], sheet_name, select_transform(file_name), raw)
+        store_result(workbooks[file_name], sheet_name, select_transform(file_name), params, df)
+        finish(index, df)
+        yield from flush()
+
+def process_sheets(select_transform, workbooks, units, params, parallel=True, on_progress=None):
+    """Process (file_name, sheet_name) units and return their frames in unit order (see iter_sheets)."""
+    results = [None] * len(units)
+    for index, df in iter_sheets(select_transform, workbooks, units, params, parallel, on_progress):
+        results[index] = df
+    return results
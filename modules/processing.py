@@ -0,0 +1,374 @@
+import hashlib
+import threading
+import time
+import uuid
+from modules.cache import transform_kind
+from modules.jobs import CANCELLED, FAILED, POLL_SECONDS, QUEUED, discard_job, get_job, queue_position, submit
+from modules.output import (
+    DOWNLOAD_FORMATS, ZIP_WORKERS, CombinedWriter, download_data, drain, open_output, write_xlsx, write_zip
+)
+from modules.parallel import iter_sheets, process_sheets
+from modules.profiling import Profile, render_profile, sheet_scope, span
+from modules.store import result_store
+from modules.transform import incremental_explode, transform_chunks
+from modules.workbook import open_workbooks, read_test_sheet_chunks, spool_upload
+
+MULTIPLE_SHEETS = "Single File (multiple sheets)"
+MULTIPLE_FILES = "Multiple Files (per sheet per file)"
+COMBINED_SHEET = "Single File (one combined sheet)"
+OUTPUT_FORMATS = [MULTIPLE_SHEETS, MULTIPLE_FILES, COMBINED_SHEET]
+# Downloads not shown for this long are dropped, and so are runs with nothing left to show
+ARTIFACT_TTL_SECONDS = 60 * 60
+
+class Artifact:
+    """A finished download and the profile recorded while producing it."""
+
+    def __init__(self, output, file_name, mime, label, profile):
+        self.output = output
+        self.file_name = file_name
+        self.mime = mime
+        self.label = label
+        self.profile = profile
+        self.used = time.monotonic()
+
+    def close(self):
+        self.output.close()
+
+def _chunked_sheets(select_transform, workbooks, units, params, chunk_rows, on_progress=None, on_chunk=None):
+    """Yield (sheet_name, frames) for each (file_name, sheet_name) unit, for large-file mode.
+
+    Nothing is read until frames is iterated, and then each sheet is read
+    and transformed chunk_rows rows at a time (see transform_chunks), so a
+    writer consuming the units in order holds one chunk at a time.
+    on_chunk(chunks, file_name, sheet_name) is called after every chunk and
+    on_progress(done, total, file_name, sheet_name) after every sheet.
+    """
+    def frames(index, file_name, sheet_name):
+        chunks = transform_chunks(
+            read_test_sheet_chunks(workbooks[file_name], sheet_name, chunk_rows), select_transform(file_name), *params
+        )
+        count = 0
+        while True:
+            # Scoped a step at a time, as the writer's spans come in between
+            with sheet_scope(file_name, sheet_name):
+                df = next(chunks, None)
+            if df is None:
+                break
+            count += 1
+            if on_chunk:
+                on_chunk(count, file_name, sheet_name)
+            yield df
+        if on_progress:
+            on_progress(index + 1, len(units), file_name, sheet_name)
+
+    for index, (file_name, sheet_name) in enumerate(units):
+        yield sheet_name, frames(index, file_name, sheet_name)
+
+def run_processing(job, select_transform, files, engine, selected_sheets, params, output_format,
+                   download_format, compression, parallel, output_names, store_key=None, incremental=False, chunk_rows=None):
+    """Process the selected sheets into one download; runs as a background job (see Run.build).
+
+    output_names gives the page's file names: 'output' (multi-sheet XLSX),
+    'sheets' and 'files' (ZIPs) and 'combined' (without extension). With a
+    store_key, a download stored under it is returned without reading the
+    files at all, and a newly built one is stored under it. incremental
+    reuses test scripts exploded by earlier runs (see explode_blocks); the
+    sheets are then processed in this process, where those are kept. With
+    chunk_rows (large-file mode) sheets are streamed through chunk_rows rows
+    at a time instead, also in this process (see _chunked_sheets).
+    """
+    file_format, extension, mime = DOWNLOAD_FORMATS[download_format]
+    parallel = parallel and not incremental and not chunk_rows
+    with open_workbooks(files, engine=engine) as workbooks, Profile().activate() as profile, incremental_explode(incremental):
+        job.update(10, "Initializing processing...")
+        if store_key is not None:
+            with span('result_store', hit=False) as counters:
+                stored = result_store.get(store_key)
+                counters['hit'] = stored is not None
+            if stored is not None:
+                output, metadata = stored
+                job.update(100, "✅ Reused the result of an identical earlier run!")
+                return Artifact(output, metadata['file_name'], metadata['mime'], metadata['label'], profile)
+        units = [(file_name, sheet_name) for file_name, sheets in selected_sheets.items() for sheet_name in sheets]
+
+        def show_progress(processed_count, total_sheets, file_name, sheet_name):
+            job.update(
+                10 + int((processed_count / total_sheets) * 70),
+                f"Processed sheet {processed_count}/{total_sheets}: {sheet_name} from {file_name}..."
+            )
+
+        def show_chunk(chunks, file_name, sheet_name):
+            job.update(job.progress, f"Processed chunk {chunks} of {sheet_name} from {file_name}...")
+
+        output = open_output()
+        try:
+            if output_format == COMBINED_SHEET:
+                # Each sheet is appended to the output as soon as it is ready, so
+                # only one sheet's frame is held at a time
+                with CombinedWriter(output, file_format, compression) as writer:
+                    if chunk_rows:
+                        sheets = _chunked_sheets(select_transform, workbooks, units, params, chunk_rows, show_progress, show_chunk)
+                        frames = (df for _, sheet in sheets for df in sheet)
+                    else:
+                        sheets = iter_sheets(select_transform, workbooks, units, params, parallel=parallel, on_progress=show_progress)
+                        frames = (df for _, df in sheets if df is not None)
+                    for df in frames:
+                        writer.append(df)
+                    job.update(90, "Finalizing output...")
+                label = "⬇️ Download Combined Excel File" if file_format == 'xlsx' else f"⬇️ Download Combined {download_format} File"
+                file_name = f"{output_names['combined']}.{extension}"
+            else:
+                if chunk_rows:
+                    # Each sheet is processed while it is written
+                    sheets = _chunked_sheets(select_transform, workbooks, units, params, chunk_rows, show_progress, show_chunk)
+                    workers = 1
+                else:
+                    results = process_sheets(select_transform, workbooks, units, params, parallel=parallel, on_progress=show_progress)
+                    processed_data = []
+                    for (file_name, sheet_name), df in zip(units, results):
+                        if df is not None:
+                            processed_data.append((sheet_name, df))  # Keep only the sheet name
+                    del results  # processed_data now holds the only reference to each frame
+                    job.update(90, "Finalizing output...")
+                    sheets = drain(processed_data)  # Frees each sheet once written
+                    workers = ZIP_WORKERS
+                if output_format == MULTIPLE_SHEETS and file_format == 'xlsx':
+                    write_xlsx(sheets, output)
+                    label, file_name = "⬇️ Download Excel File", output_names['output']
+                else:
+                    write_zip(sheets, output, file_format, workers=workers, compression=compression)
+                    if output_format == MULTIPLE_SHEETS:
+                        label, file_name = f"⬇️ Download ZIP of {download_format} Files", output_names['sheets']
+                    else:
+                        label, file_name = "⬇️ Download ZIP File", output_names['files']
+                    mime = "application/zip"
+        except BaseException:
+            output.close()
+            raise
+        if store_key is not None:
+            with span('store_result') as counters:
+                output.seek(0)
+                try:
+                    result_store.put(store_key, output, {'file_name': file_name, 'mime': mime, 'label': label})
+                except OSError:
+                    pass  # Disk full or not writable; the download itself is fine
+                counters['bytes'] = output.tell()
+    output.flush()  # So download_data sees everything through the file descriptor
+    job.update(100, "✅ Processing completed successfully!")
+    return Artifact(output, file_name, mime, label, profile)
+
+class Run:
+    """The inputs of one Start Processing and every download built from them.
+
+    Each (output_format, download_format, compression) selection is built
+    once, by its own background job, one at a time per run, and kept for ARTIFACT_TTL_SECONDS
+    after it was last shown. The transformed frames stay in the shared
+    result cache (modules/cache.py), so building another format for the
+    same run only writes; sheets evicted from the cache since are redone.
+    """
+
+    def __init__(self, select_transform, files, engine, selected_sheets, params, output_names):
+        self.id = uuid.uuid4().hex
+        self.select_transform = select_transform
+        self.files = files
+        self.engine = engine
+        self.selected_sheets = selected_sheets
+        self.params = params
+        self.output_names = output_names
+        # What a later Start Processing must match to reuse this run
+        self.inputs = (
+            transform_kind(select_transform), [(file.name, _digest(file)) for file in files],
+            engine, {file_name: sheets for file_name, sheets in selected_sheets.items() if sheets}, params
+        )
+        self.artifacts = {}  # selection -> Artifact
+        self.jobs = {}  # selection -> ID of the job building it, in request order
+        self.used = time.monotonic()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def request(self, selection, parallel=True, incremental=False, chunk_rows=None):
+        """Start building selection unless it is built or being built already."""
+        self.used = time.monotonic()
+        with self._lock:
+            if selection in self.artifacts:
+                self.artifacts[selection].used = self.used
+                return
+            job = get_job(self.jobs.get(selection))
+            if job is not None and job.status not in (FAILED, CANCELLED):
+                return
+            self.jobs.pop(selection, None)
+            self.jobs[selection] = submit(self.build, selection, parallel, incremental, chunk_rows, group=self.id)
+
+    def build(self, job, selection, parallel=True, incremental=False, chunk_rows=None):
+        """Job body: process the run's sheets into the download for selection, or reuse a stored one."""
+        artifact = run_processing(
+            job, self.select_transform, self.files, self.engine, self.selected_sheets, self.params,
+            *selection, parallel, self.output_names, result_store.key(self.inputs, selection, self.output_names), incremental,
+            chunk_rows
+        )
+        with self._lock:
+            if self.closed:
+                artifact.close()
+            else:
+                self.artifacts[selection] = artifact
+        return selection
+
+    def expire_artifacts(self, now):
+        with self._lock:
+            expired = [selection for selection, artifact in self.artifacts.items() if now - artifact.used > ARTIFACT_TTL_SECONDS]
+            for selection in expired:
+                self.artifacts.pop(selection).close()
+                self.jobs.pop(selection, None)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            for job_id in self.jobs.values():
+                discard_job(job_id)
+            for artifact in self.artifacts.values():
+                artifact.close()
+            self.artifacts.clear()
+            for file in self.files:
+                file.close()
+
+_runs = {}
+_runs_lock = threading.Lock()
+
+def get_run(run_id):
+    """The run with this ID, or None if it never existed or has expired."""
+    now = time.monotonic()
+    with _runs_lock:
+        runs = list(_runs.values())
+    for run in runs:
+        run.expire_artifacts(now)
+        if not run.artifacts and now - run.used > ARTIFACT_TTL_SECONDS:
+            discard_run(run.id)
+    with _runs_lock:
+        return _runs.get(run_id)
+
+def discard_run(run_id):
+    with _runs_lock:
+        run = _runs.pop(run_id, None)
+    if run is not None:
+        run.close()
+
+def start_processing(state_key, select_transform, uploaded_files, engine, selected_sheets, params,
+                     selection, parallel, output_names, incremental=False, chunk_rows=None):
+    """Build the selected download for the page, as a background job, and remember the run under state_key.
+
+    selection is (output_format, download_format, compression). The uploads
+    the run needs are copied first, since the job outlives this script run
+    and the UploadedFiles with it; large copies are spooled to disk. If the
+    page's last run had the same files, sheets and parameters, the new
+    selection is added to it and only the writing is done again; otherwise
+    that run is dropped, so each session keeps at most one run per page.
+    The run ID is also put in the page URL, so reloading the tab finds the
+    run again. chunk_rows turns on large-file mode (see run_processing).
+    """
+    import streamlit as st
+    files = [spool_upload(uploaded_file) for uploaded_file in uploaded_files if selected_sheets.get(uploaded_file.name)]
+    run = Run(select_transform, files, engine, selected_sheets, params, output_names)
+    previous = get_run(_run_id(state_key))
+    if previous is not None and previous.inputs == run.inputs:
+        run.close()  # Only holds the new copies of the uploads
+        run = previous
+    else:
+        if previous is not None:
+            discard_run(previous.id)
+        with _runs_lock:
+            _runs[run.id] = run
+    run.request(selection, parallel, incremental, chunk_rows)
+    st.session_state[state_key] = run.id
+    st.query_params[state_key] = run.id
+
+def _digest(file):
+    file.seek(0)
+    digest = hashlib.file_digest(file, 'sha256').hexdigest()
+    file.seek(0)
+    return digest
+
+def _run_id(state_key):
+    import streamlit as st
+    return st.session_state.get(state_key) or st.query_params.get(state_key)
+
+def _describe(selection):
+    output_format, download_format, compression = selection
+    return f"{output_format}, {download_format}" + (f" ({compression})" if compression else "")
+
+def render_run(state_key, profile_file_name, selection=None):
+    """Show the page's run: progress of the downloads being built, polling until they finish, and the finished ones.
+
+    selection is what the page currently has selected, whose download
+    button and profile are shown if it has been built; otherwise the latest
+    download's profile is. Other finished downloads are only listed, with
+    their button behind a "Show download" click.
+    """
+    import streamlit as st
+    run = get_run(_run_id(state_key))
+    if run is None:
+        return
+    run.used = time.monotonic()
+
+    def poll(job):
+        if job.done:
+            st.rerun()  # Full rerun, which renders the result and stops polling
+        st.progress(job.progress)
+        if job.status == QUEUED:
+            ahead = queue_position(job)
+            st.info(f"Waiting for a free worker ({ahead} job{'s' if ahead != 1 else ''} ahead)...")
+        else:
+            st.info(job.message)
+        if st.button("✖️ Cancel processing", key=f"{state_key}_cancel_{job.id}"):
+            job.cancel()
+
+    poll = st.fragment(run_every=POLL_SECONDS)(poll)
+    profile = None
+    for index, (built, job_id) in enumerate(list(run.jobs.items())):
+        artifact = run.artifacts.get(built)
+        job = get_job(job_id)
+        if artifact is not None:
+            artifact.used = run.used
+            st.success(f"✅ {_describe(built)}")
+            # Every shown download is copied into memory on each rerun, so
+            # only the selected one is shown unless another is asked for
+            show_key = f"{state_key}_show_{job_id}"
+            if built == selection or st.session_state.get(show_key):
+                st.download_button(
+                    label=artifact.label,
+                    data=download_data(artifact.output),
+                    file_name=artifact.file_name,
+                    mime=artifact.mime,
+                    key=f"{state_key}_download_{index}",
+                )
+            else:
+                st.button(
+                    f"Show download ({artifact.file_name})", key=f"{show_key}_button",
+                    on_click=st.session_state.__setitem__, args=(show_key, True)
+                )
+            exploded = [span_record for span_record in artifact.profile.spans if 'reused_blocks' in span_record]
+            if exploded:
+                reused = sum(span_record['reused_blocks'] for span_record in exploded)
+                st.caption(f"♻️ Reused {reused} of {sum(span_record['blocks'] for span_record in exploded)} test scripts from earlier runs")
+            if profile is None or built == selection:
+                profile = artifact.profile
+            shown = st.session_state.setdefault(f"{state_key}_shown", set())
+            if job_id not in shown:
+                shown.add(job_id)
+                st.balloons()
+        elif job is None:
+            continue  # Expired
+        elif not job.done:
+            st.markdown(f"**{_describe(built)}**")
+            poll(job)
+        elif job.status == FAILED:
+            st.error(f"❌ Processing failed: {str(job.error)}")
+            st.exception(job.error)
+        elif job.status == CANCELLED:
+            st.warning(f"Processing was cancelled: {_describe(built)}")
+    if profile is not None:
+        render_profile(profile, profile_file_name)
+    stats = result_store.stats()
+    st.caption(
+        f"Shared result store: {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['entries']} stored ({stats['bytes'] / (1024 * 1024):.1f} MiB)"
+    )
@@ -0,0 +1,125 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+
+# The profile being recorded and the sheet being worked on, if any. Context
+# variables, so concurrent Streamlit sessions each see their own.
+_profile = contextvars.ContextVar('profile', default=None)
+_sheet = contextvars.ContextVar('sheet', default=None)
+_parent = contextvars.ContextVar('parent', default=None)
+
+def rss_bytes():
+    return psutil.Process().memory_info().rss
+
+class Profile:
+    """Timing spans recorded during one processing run.
+
+    Each span is a dict with its name, the sheet it belongs to (or None for
+    run-wide stages like writing the output), the span it ran inside (whose
+    time includes it), wall seconds, the process RSS when it ended and how
+    much that grew during it, plus any counters (rows, bytes) the
+    instrumented code added.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def record(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    @contextmanager
+    def activate(self):
+        token = _profile.set(self)
+        try:
+            yield self
+        finally:
+            _profile.reset(token)
+
+    def by_sheet(self):
+        """Spans grouped by sheet, in the order sheets first appear; run-wide spans come last under None."""
+        sheets = {}
+        for span_record in self.spans:
+            sheets.setdefault(span_record['sheet'], []).append(span_record)
+        if None in sheets:
+            sheets[None] = sheets.pop(None)
+        return sheets
+
+    def to_dict(self):
+        return {
+            'seconds': round(time.perf_counter() - self._started, 4),
+            'peak_rss_bytes': max((span_record['rss_bytes'] for span_record in self.spans), default=rss_bytes()),
+            'spans': self.spans,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+def record_spans(spans):
+    """Add spans recorded elsewhere (e.g. in a worker process) to the active profile."""
+    profile = _profile.get()
+    if profile is not None:
+        profile.record(spans)
+
+@contextmanager
+def sheet_scope(file_name, sheet_name):
+    """Attribute the spans recorded inside to one sheet."""
+    token = _sheet.set(f"{file_name} / {sheet_name}")
+    try:
+        yield
+    finally:
+        _sheet.reset(token)
+
+@contextmanager
+def span(name, **counters):
+    """Time the block into the active profile, if there is one.
+
+    Yields the counters dict so the block can add rows/bytes it only knows at
+    the end. Without an active profile this costs next to nothing.
+    """
+    profile = _profile.get()
+    if profile is None:
+        yield counters
+        return
+    rss_before = rss_bytes()
+    parent = _parent.get()
+    token = _parent.set(name)
+    started = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        seconds = time.perf_counter() - started
+        _parent.reset(token)
+        rss_after = rss_bytes()
+        profile.record([{
+            'name': name,
+            'sheet': _sheet.get(),
+            'parent': parent,
+            'seconds': round(seconds, 6),
+            'rss_bytes': rss_after,
+            'rss_delta_bytes': rss_after - rss_before,
+            **counters,
+        }])
+
+def render_profile(profile, file_name):
+    """Collapsible per-sheet breakdown of a profile, plus a JSON download of it."""
+    # Imported here so workers and the CLI can record spans without Streamlit
+    import pandas as pd
+    import streamlit as st
+    with st.expander("⏱️ Processing profile", expanded=False):
+        for sheet, spans in profile.by_sheet().items():
+            st.markdown(f"**{sheet or 'Output'}**")
+            breakdown = pd.DataFrame(spans).drop(columns=['sheet', 'rss_bytes'])
+            breakdown['rss_delta_bytes'] = breakdown['rss_delta_bytes'] / (1024 * 1024)
+            st.dataframe(breakdown.rename(columns={'rss_delta_bytes': 'RSS delta (MiB)'}), hide_index=True)
+        st.download_button(
+            label="⬇️ Download profile (JSON)",
+            data=profile.to_json().encode('utf-8'),
+            file_name=file_name,
+            mime="application/json",
+        )
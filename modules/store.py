@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+# Shared by every session and kept across restarts; bump STORE_VERSION when a
+# change alters what the same inputs produce, so older results aren't served.
+# The directory is created private to this user, and refused if someone else
+# got there first
+RESULT_STORE_DIR = os.path.join(tempfile.gettempdir(), 'splitter-result-store')
+RESULT_STORE_BYTES = 2 * 1024 * 1024 * 1024
+STORE_VERSION = 1
+
+class ResultStore:
+    """Size-capped LRU of finished downloads on disk, keyed on everything that determines their content.
+
+    Each entry is a data file plus a JSON file of metadata (file name, MIME
+    type, ...) under a directory named after the key. Entries are written
+    to a temporary name and renamed into place, so processes sharing the
+    directory never see half-written ones. Last use is the data file's
+    mtime, which eviction goes by once the total size passes max_bytes.
+    The entry count and total size are counted from disk on first use and
+    kept up to date from then on; entries written by other processes are
+    only picked up by the next eviction, which counts again.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._checked = False
+        self._entry_count = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _check_directory(self):
+        """Create the directory (mode 0700), or make sure an existing one is a directory of this user's."""
+        if self._checked:
+            return
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        status = os.lstat(self.directory)
+        if not stat.S_ISDIR(status.st_mode) or (hasattr(os, 'getuid') and status.st_uid != os.getuid()):
+            raise PermissionError(f"Result store {self.directory} is not a directory owned by this user")
+        if stat.S_IMODE(status.st_mode) & 0o077:
+            os.chmod(self.directory, 0o700)
+        self._checked = True
+
+    def _count(self):
+        # Under self._lock
+        if self._entry_count is None:
+            sizes = [size for _, size, _ in self._entries()]
+            self._entry_count, self._total_bytes = len(sizes), sum(sizes)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps([STORE_VERSION, *parts], default=str).encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        entry = os.path.join(self.directory, key[:2], key)
+        return entry + '.data', entry + '.json'
+
+    def get(self, key):
+        """(open binary file, metadata) for key, or None."""
+        data_path, meta_path = self._paths(key)
+        try:
+            self._check_directory()
+            with open(meta_path, encoding='utf-8') as meta_file:
+                metadata = json.load(meta_file)
+            data = open(data_path, 'rb')
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass  # Evicted meanwhile; the open file stays readable
+        with self._lock:
+            self.hits += 1
+        return data, metadata
+
+    def put(self, key, stream, metadata):
+        """Store the rest of stream (from its current position) under key, then evict down to max_bytes."""
+        self._check_directory()
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), mode=0o700, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(data_path), delete=False) as temp:
+            shutil.copyfileobj(stream, temp)
+            size = temp.tell()
+        try:
+            replaced = os.stat(data_path).st_size
+        except OSError:
+            replaced = None
+        os.replace(temp.name, data_path)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(meta_path), delete=False) as temp:
+            json.dump(metadata, temp)
+        os.replace(temp.name, meta_path)
+        with self._lock:
+            self._count()
+            self._entry_count += replaced is None
+            self._total_bytes += size - (replaced or 0)
+            full = self._total_bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def _entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.data'):
+                    path = os.path.join(root, name)
+                    try:
+                        status = os.stat(path)
+                    except OSError:
+                        continue
+                    yield status.st_mtime, status.st_size, path
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            for stale in (path, path[:-len('.data')] + '.json'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
+            count -= 1
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._entry_count, self._total_bytes = count, total
+
+    def stats(self):
+        with self._lock:
+            self._count()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': self._entry_count,
+                'bytes': self._total_bytes,
+            }
+
+result_store = ResultStore(RESULT_STORE_DIR, RESULT_STORE_BYTES)
@@ -0,0 +1,290 @@
+import contextvars
+import pickle
+import re
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from modules.cache import exploded_blocks
+from modules.profiling import span
+from modules.workbook import COLUMN_RENAMES, HEADER_MATCH_RATIO, TEST_SCRIPT_COLUMNS, locate_header
+
+STEP_COLUMNS = ['Execution_Sequence', 'Expected_Result']
+STEP_SPLIT_PATTERN = re.compile(r'\n(?=\d+\.\s*)')
+FINAL_COLUMNS = TEST_SCRIPT_COLUMNS + [
+    'Test Envi',
+    'Test Phase',
+    'epic link',
+    'summary',
+    'feature',
+    'squad',
+    'Priority'
+]
+# Columns holding a handful of distinct values repeated on every row, stored
+# as categoricals: one small integer code per row instead of a string object
+COMPACT_COLUMNS = [
+    'Scenario Type',
+    'Product / Akad',
+    'Assigned Tester',
+    'Test Envi',
+    'Test Phase',
+    'epic link',
+    'feature',
+    'squad',
+    'Priority'
+]
+
+# Whether explode_steps may reuse blocks exploded earlier, see incremental_explode
+_incremental = contextvars.ContextVar('incremental', default=False)
+_BLOCK_COLUMN = '__block__'
+
+# positions: where each kept column sits in the sheet's header, in
+# TEST_SCRIPT_COLUMNS order; columns: their names after COLUMN_RENAMES
+TransformPlan = namedtuple('TransformPlan', ['positions', 'columns', 'explode'])
+
+@lru_cache(maxsize=256)
+def compile_plan(header, explode):
+    """Column mapping for sheets whose header is the tuple `header`, or None if it isn't a test-script header.
+
+    Sheets from the same template share a header, so the renames and column
+    selection are worked out once per template rather than once per sheet.
+    """
+    renamed = [COLUMN_RENAMES.get(name, name) if isinstance(name, str) else name for name in header]
+    if len(set(renamed).intersection(TEST_SCRIPT_COLUMNS)) < len(TEST_SCRIPT_COLUMNS) * HEADER_MATCH_RATIO:
+        return None
+    # Duplicate header names keep every copy, like df[names] would
+    positions = tuple(i for column in TEST_SCRIPT_COLUMNS for i, name in enumerate(renamed) if name == column)
+    return TransformPlan(positions, tuple(renamed[i] for i in positions), explode)
+
+def explode_steps(df):
+    """Explode each test script into one row per numbered step.
+
+    Execution_Sequence and Expected_Result are split on their step numbers and
+    padded with '' to the same length; every other column is repeated for each
+    step. Scripts without step text in either column produce no rows.
+    """
+    df = df.reset_index(drop=True)
+    split_steps = {}
+    for col in STEP_COLUMNS:
+        is_text = df[col].map(type).eq(str).to_numpy()
+        parts = df.loc[is_text, col].str.split(STEP_SPLIT_PATTERN)
+        counts = np.zeros(len(df), dtype=np.int64)
+        counts[is_text] = parts.str.len().to_numpy()
+        split_steps[col] = (parts.explode().to_numpy(), counts)
+
+    steps = np.maximum(*(counts for _, counts in split_steps.values()))
+    row_starts = np.cumsum(steps) - steps
+    parent_rows = np.repeat(np.arange(len(df)), steps)
+
+    df_exploded = pd.DataFrame(index=pd.RangeIndex(len(parent_rows)))
+    for col, (values, counts) in split_steps.items():
+        # Position of every split value inside its script, shifted to that script's first output row
+        step_offsets = np.arange(len(values)) - np.repeat(np.cumsum(counts) - counts, counts)
+        column = np.full(len(parent_rows), '', dtype=object)
+        column[np.repeat(row_starts, counts) + step_offsets] = values
+        df_exploded[col] = column
+
+    parents = df.drop(columns=STEP_COLUMNS).take(parent_rows).reset_index(drop=True)
+    return pd.concat([df_exploded, parents.infer_objects()], axis=1)
+
+@contextmanager
+def incremental_explode(enabled=True):
+    """Within this block, transforms explode only test scripts they haven't exploded before (see explode_blocks)."""
+    token = _incremental.set(enabled)
+    try:
+        yield
+    finally:
+        _incremental.reset(token)
+
+def _ranges(starts, lengths):
+    """np.concatenate([np.arange(start, start + length) ...]) without a Python loop."""
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+def block_fingerprints(df):
+    """Split df into TEST SCRIPT NUMBER blocks; returns their start rows, lengths and fingerprints.
+
+    A block is a row with a TEST SCRIPT NUMBER plus the rows after it
+    without one (rows before the first number form a block of their own).
+    Its fingerprint is a 64-bit hash of its cell values, row order and
+    length, and of the column names.
+    """
+    is_start = df['TEST SCRIPT NUMBER'].notna().to_numpy()
+    is_start[0] = True
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(starts, len(df)))
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    # Weigh each row by its position in the block, so reordered rows hash differently
+    positions = np.arange(len(df)) - np.repeat(starts, lengths)
+    weights = pd.util.hash_array(positions.astype(np.uint64)) | np.uint64(1)
+    layout = pd.util.hash_array(np.array([repr(tuple(df.columns))], dtype=object))[0]
+    fingerprints = np.add.reduceat(row_hashes * weights, starts) ^ lengths.astype(np.uint64) ^ layout
+    return starts, lengths, fingerprints.tolist()
+
+def explode_blocks(df, counters):
+    """explode_steps(df), reusing the exploded rows of test-script blocks seen before.
+
+    Blocks (see block_fingerprints) found in the shared exploded_blocks
+    store are taken from there; only the rest go through explode_steps,
+    together, and are stored in turn. A revised test pack thus only pays for
+    the scripts that changed. Numbering (NO.) is left to run_plan, which
+    works on the whole sheet, so it comes out as in a full run. counters
+    gets 'blocks' and 'reused_blocks'.
+    """
+    df = df.reset_index(drop=True)
+    if df.empty:
+        return explode_steps(df)
+    starts, lengths, fingerprints = block_fingerprints(df)
+    found = exploded_blocks.find(fingerprints)
+    missing = [index for index, location in enumerate(found) if location is None]
+    counters['blocks'] = len(found)
+    counters['reused_blocks'] = len(found) - len(missing)
+
+    if missing:
+        missing = np.array(missing)
+        tagged = df.take(_ranges(starts[missing], lengths[missing]))
+        tagged[_BLOCK_COLUMN] = np.repeat(np.arange(len(missing)), lengths[missing])
+        fresh = explode_steps(tagged)
+        bounds = np.searchsorted(fresh.pop(_BLOCK_COLUMN).to_numpy(), np.arange(len(missing) + 1)).tolist()
+        fresh = fresh.copy()  # Consolidated, so every later take is one per dtype rather than per column
+        exploded_blocks.add([fingerprints[index] for index in missing], bounds, fresh)
+        for number, index in enumerate(missing.tolist()):
+            found[index] = (fresh, bounds[number], bounds[number + 1])
+
+    # One take per source frame, then the pieces are put back in block order
+    frames = {}
+    source = np.array([frames.setdefault(id(frame), (len(frames), frame))[0] for frame, _, _ in found])
+    first_rows = np.array([start for _, start, _ in found])
+    block_rows = np.array([end for _, _, end in found]) - first_rows
+    offsets = np.cumsum(block_rows) - block_rows
+    if len(frames) == 1:
+        exploded = found[0][0].take(_ranges(first_rows, block_rows))
+    else:
+        pieces = []
+        order = []
+        for number, frame in frames.values():
+            blocks = source == number
+            pieces.append(frame.take(_ranges(first_rows[blocks], block_rows[blocks])))
+            order.append(_ranges(offsets[blocks], block_rows[blocks]))
+        exploded = pd.concat(pieces, ignore_index=True).take(np.argsort(np.concatenate(order), kind='stable'))
+    exploded.index = pd.RangeIndex(len(exploded))
+    # Blocks from different explodes can disagree on dtypes; settle them as one explode_steps call would
+    return exploded.infer_objects(copy=False)
+
+def constant_column(value, length):
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+def run_plan(plan, df, epic_link='', feature='', squad='', priority='High'):
+    """Select, optionally explode and decorate a sheet whose columns match plan."""
+    df = df.dropna(how='all').iloc[:, list(plan.positions)].reset_index(drop=True)
+    df.columns = list(plan.columns)
+
+    if plan.explode:
+        with span('explode', rows_in=len(df)) as counters:
+            if _incremental.get() and 'TEST SCRIPT NUMBER' in df.columns:
+                df = explode_blocks(df, counters)
+            else:
+                df = explode_steps(df)
+            counters['rows'] = len(df)
+
+    df['Test Envi'] = constant_column('SIT', len(df))
+    df['Test Phase'] = constant_column('SIT1', len(df))
+    df['epic link'] = constant_column(epic_link, len(df))
+    # explode_steps leaves a column float when no row it kept had text there
+    df['TEST SCRIPT NUMBER'] = df['TEST SCRIPT NUMBER'].astype(object)
+    df['summary'] = df['TEST SCRIPT NUMBER'] + '_' + df['GENERAL INFORMATION / SUMMARY OF THE TEST SCRIPT']
+    df['feature'] = constant_column(feature, len(df))
+    df['squad'] = constant_column(squad, len(df))
+    df['Priority'] = constant_column(priority, len(df))
+    df['Assigned Tester'] = constant_column('', len(df))
+    for col in ('Scenario Type', 'Product / Akad'):
+        df[col] = df[col].astype('category')
+
+    # NO. counts test scripts from 0; TEST SCRIPT NUMBER is only kept on a script's first row
+    df['NO.'] = df.groupby('TEST SCRIPT NUMBER').ngroup()
+    if df['TEST SCRIPT NUMBER'].notna().any():  # Filling an all-NaN column would turn it float again
+        df['TEST SCRIPT NUMBER'] = df['TEST SCRIPT NUMBER'].ffill()
+    df.loc[df.duplicated(subset=['TEST SCRIPT NUMBER']), 'TEST SCRIPT NUMBER'] = ''
+    return df[FINAL_COLUMNS]
+
+def transform_sheet(df, explode, epic_link='', feature='', squad='', priority='High'):
+    """Shared body of the splitter's (explode=True) and the converter's transforms.
+
+    Frames from read_test_sheet already carry their header and go straight
+    to the template's compiled plan; anything else is scanned for the header
+    row first.
+    """
+    plan = compile_plan(tuple(df.columns), explode)
+    if plan is None:
+        with span('locate_header', rows_in=len(df)) as counters:
+            df = locate_header(df)
+            counters['rows'] = len(df)
+        plan = compile_plan(tuple(df.columns), explode)
+    return run_plan(plan, df, epic_link, feature, squad, priority)
+
+def transform_chunks(chunks, transform, *params):
+    """Apply transform to a sheet read in chunks, yielding frames that together equal transforming it whole.
+
+    No test script may span two chunks (see read_test_sheet_chunks), so
+    they transform independently except for what depends on the whole
+    sheet: NO. and the clearing of repeated TEST SCRIPT NUMBERs. Every chunk
+    is therefore transformed and spilled to a temporary file first, while
+    the numbers left after the transform are collected; then each is read
+    back, its NO. mapped from its own numbering onto the sheet's, and
+    numbers an earlier chunk kept are cleared. A sheet that comes in one
+    chunk is yielded as it is.
+    """
+    numbers = set()
+    unnumbered = False  # Whether NO. has gaps, which makes it float
+    with tempfile.TemporaryFile() as spill:
+        first = None
+        count = 0
+        for chunk in chunks:
+            with span('transform_chunk', rows_in=len(chunk)) as counters:
+                df = transform(chunk, *params)
+                script = df['TEST SCRIPT NUMBER']
+                numbers.update(script[script.notna() & script.ne('')])
+                unnumbered = unnumbered or bool(df['NO.'].isna().any())
+                counters['rows'] = len(df)
+            if count == 0:
+                first = df  # Only spilled once a second chunk comes
+            else:
+                if first is not None:
+                    pickle.dump(first, spill, pickle.HIGHEST_PROTOCOL)
+                    first = None
+                pickle.dump(df, spill, pickle.HIGHEST_PROTOCOL)
+            count += 1
+        if count == 1:
+            yield first
+            return
+
+        spill.seek(0)
+        positions = {number: position for position, number in enumerate(sorted(numbers))}
+        seen = set()
+        earlier_rows = False
+        for _ in range(count):
+            with span('renumber_chunk') as counters:
+                df = pickle.load(spill)
+                script = df['TEST SCRIPT NUMBER']
+                kept = script.notna() & script.ne('')
+                # ngroup numbered the chunk's own scripts in sorted order, leaving NaN for rows without one
+                local = np.array([positions[number] for number in sorted(script[kept].unique())], dtype=np.float64)
+                group = df['NO.'].to_numpy(dtype=np.float64)
+                numbered = ~np.isnan(group)
+                group[numbered] = local[group[numbered].astype(np.int64)]
+                df['NO.'] = group if unnumbered else group.astype(np.int64)
+                repeated = kept & script.isin(seen)
+                if earlier_rows:
+                    # Rows the chunk couldn't fill from a number of its own; the
+                    # whole sheet fills them from an earlier row, so they repeat it
+                    repeated |= script.isna()
+                seen.update(script[kept & ~repeated])
+                df.loc[repeated, 'TEST SCRIPT NUMBER'] = ''
+                earlier_rows = earlier_rows or len(df) > 0
+                # Text columns a chunk happens to leave blank come out float (see run_plan);
+                # keep them text so the chunks agree on dtypes
+                blank = [col for col in df.columns if col != 'NO.' and df[col].dtype == np.float64 and df[col].isna().all()]
+                df[blank] = df[blank].astype(object)
+                counters['rows'] = len(df)
+            yield df
@@ -1,33 +1,103 @@
-import streamlit as st
+import math
+import openpyxl
 import pandas as pd
 import time
+from modules.parallel import MAX_WORKERS, PARALLEL_MIN_TASKS, run_in_processes
+from modules.workbook import NamedBytesIO, available_engines, resolve_engine
 
-def verify_excel(file):
+VERIFY_COLUMNS = ['TEST SCRIPT NUMBER', 'Execution_Sequence', 'Expected_Result']
+# read_excel's default na_values: these cells were NaN, so they don't count as filled
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+def _is_filled(value):
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value not in NA_STRINGS
+    return not (isinstance(value, float) and math.isnan(value))
+
+def _script_key(value):
+    # read_excel turns whole floats into ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def count_script_steps(file):
+    """Count filled test steps and expected results per test script.
+
+    Opens the workbook once in openpyxl read-only mode, picks 'Sheet1' (or the
+    first worksheet) and streams it row by row, looking only at the three
+    verified columns and forward-filling TEST SCRIPT NUMBER. No DataFrame is
+    built. Returns {script_id: [test_steps, expected_results]}.
+    """
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
     try:
-        df = pd.read_excel(file, sheet_name='Sheet1')
-    except ValueError:
-    # Load the first available sheet if 'Sheet1' not found
-        sheet_names = pd.ExcelFile(file).sheet_names
-        df = pd.read_excel(file, sheet_name=sheet_names[0])
+        sheet = workbook['Sheet1'] if 'Sheet1' in workbook.sheetnames else workbook.worksheets[0]
+        sheet.reset_dimensions()  # The stored <dimension> may be wrong
+        rows = sheet.iter_rows(values_only=True)
+        # Like read_excel, the header is the first row, even if it is blank
+        header = list(next(rows, ()))
+        for column in VERIFY_COLUMNS:
+            if column not in header:
+                raise KeyError(column)
+        script_at, steps_at, results_at = (header.index(column) for column in VERIFY_COLUMNS)
+        last_at = max(script_at, steps_at, results_at)
+
+        counts = {}
+        script_id = None
+        for row in rows:
+            if len(row) <= last_at:
+                row = tuple(row) + (None,) * (last_at + 1 - len(row))
+            if _is_filled(row[script_at]):
+                script_id = _script_key(row[script_at])
+            if script_id is None:
+                continue
+            script_counts = counts.setdefault(script_id, [0, 0])
+            script_counts[0] += _is_filled(row[steps_at])
+            script_counts[1] += _is_filled(row[results_at])
+        return counts
+    finally:
+        workbook.close()
+
+def count_script_steps_frame(file, engine):
+    """Same counts as count_script_steps, through read_excel with the given engine.
+
+    Only the three verified columns are parsed, which is where a native reader
+    like calamine pays off over openpyxl's row streaming.
+    """
+    with pd.ExcelFile(file, engine=engine) as workbook:
+        sheet_name = 'Sheet1' if 'Sheet1' in workbook.sheet_names else 0
+        df = workbook.parse(sheet_name, usecols=lambda column: column in VERIFY_COLUMNS)
+    for column in VERIFY_COLUMNS:
+        if column not in df.columns:
+            raise KeyError(column)
 
+    script_ids = df['TEST SCRIPT NUMBER'].ffill()
+    filled = df[VERIFY_COLUMNS[1:]].notna() & df[VERIFY_COLUMNS[1:]].ne('')
+    grouped = filled[script_ids.notna()].groupby(script_ids.dropna().map(_script_key), sort=False).sum()
+    return {script_id: [int(steps), int(results)] for script_id, (steps, results) in grouped.iterrows()}
+
+def verify_excel(file, engine='auto'):
     try:
-        df['TEST SCRIPT NUMBER'] = df['TEST SCRIPT NUMBER'].ffill()
-        
-        invalid_scripts = []
-        
-        for script_id, group in df.groupby('TEST SCRIPT NUMBER'):
-            test_steps = group['Execution_Sequence'].count()
-            expected_results = group['Expected_Result'].count()
-            
-            if test_steps != expected_results:
-                invalid_scripts.append({
-                    'File Name': file.name,
-                    'Script ID': script_id,
-                    'Test Steps': test_steps,
-                    'Expected Results': expected_results
-                })
+        if resolve_engine(engine) == 'openpyxl':
+            counts = count_script_steps(file)
+        else:
+            counts = count_script_steps_frame(file, resolve_engine(engine))
+        invalid = [script_id for script_id, (steps, results) in counts.items() if steps != results]
+        try:
+            invalid.sort()
+        except TypeError:
+            pass  # Mixed id types, keep sheet order
         
-        return pd.DataFrame(invalid_scripts)
+        return pd.DataFrame({
+            'File Name': file.name,
+            'Script ID': pd.Series(invalid, dtype=object),
+            'Test Steps': [counts[script_id][0] for script_id in invalid],
+            'Expected Results': [counts[script_id][1] for script_id in invalid]
+        })
     
     except Exception as e:
         return pd.DataFrame({
@@ -35,7 +105,40 @@ def verify_excel(file):
             'Error': [f"Processing error: {str(e)}"]
         })
 
+def _verify_bytes(file_name, data, engine):
+    # Runs in a worker process, which only ever sees plain bytes
+    return verify_excel(NamedBytesIO(data, file_name), engine)
+
+def verify_files(files, parallel=True, on_progress=None, engine='auto'):
+    """Verify uploaded files and return their reports in upload order.
+
+    Larger batches run on a process pool; on_progress(done, total, file_name)
+    is called as each file completes.
+    """
+    total = len(files)
+    workers = min(MAX_WORKERS, total)
+    if not parallel or workers < 2 or total < PARALLEL_MIN_TASKS:
+        reports = []
+        for done, file in enumerate(files, start=1):
+            reports.append(verify_excel(file, engine))
+            if on_progress:
+                on_progress(done, total, file.name)
+        return reports
+
+    done = 0
+
+    def collect(index, report):
+        nonlocal done
+        done += 1
+        if on_progress:
+            on_progress(done, total, files[index].name)
+
+    tasks = [(file.name, file.getvalue(), engine) for file in files]
+    return run_in_processes(_verify_bytes, tasks, workers, on_result=collect)
+
 def render_verifier():
+    # Imported here so worker processes can load verify_excel without Streamlit
+    import streamlit as st
     st.title('📊 Multi-File Test Script Verifier')
     st.caption("Developed with Streamlit 🚀")
     footer_html = """<div style='text-align: center;'>
@@ -53,38 +156,37 @@ def render_verifier():
     if uploaded_files:
         st.write(f"Uploaded files: {[file.name for file in uploaded_files]}")
 
+    parallel = st.checkbox(
+        "Verify files in parallel",
+        value=True,
+        help="Spread larger batches over all CPU cores; a couple of files always run in one process"
+    )
+
+    engine = st.selectbox(
+        "Excel reader",
+        ['auto'] + available_engines(),
+        help="'auto' uses calamine when it is installed and falls back to openpyxl"
+    )
+
     if st.button('🔍 Verify Files', type='primary'):
         if not uploaded_files:
             st.warning("⚠️ Please upload at least one Excel file")
         else:
             progress_bar = st.progress(0)
             status_container = st.empty()
-            all_results = []
-            total_files = len(uploaded_files)
             
             with st.spinner('🚀 Processing files...'):
-                for i, file in enumerate(uploaded_files):
-                    progress = int((i + 1) / total_files * 100)
-                    progress_bar.progress(progress)
-                    
+                def show_progress(completed, total_files, file_name):
+                    progress_bar.progress(int(completed / total_files * 100))
                     status_container.markdown(f"""
-                    🛠 **Processing File {i+1}/{total_files}**  
-                    📄 File Name: `{file.name}`  
-                    ⏳ Status: Analyzing...
-                    """)
-                    
-                    time.sleep(0.1)
-                    file_results = verify_excel(file)
-                    
-                    if not file_results.empty:
-                        all_results.append(file_results)
-                    
-                    status_container.markdown(f"""
-                    ✅ **Completed File {i+1}/{total_files}**  
-                    📄 File Name: `{file.name}`  
+                    ✅ **Completed File {completed}/{total_files}**  
+                    📄 File Name: `{file_name}`  
                     🕒 Status: Analysis completed
                     """)
-                    time.sleep(0.2)
+                
+                file_reports = verify_files(uploaded_files, parallel=parallel, on_progress=show_progress, engine=engine)
+                # Reports are in upload order, so combined_results is too
+                all_results = [file_results for file_results in file_reports if not file_results.empty]
 
             progress_bar.empty()
             status_container.empty()
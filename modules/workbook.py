@@ -0,0 +1,382 @@
+import hashlib
+import importlib.util
+import io
+import numpy as np
+import pandas as pd
+import posixpath
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import namedtuple
+from contextlib import ExitStack, closing, contextmanager
+from itertools import islice
+from modules.profiling import span
+from pandas.io.parsers import TextParser
+from xml.etree import ElementTree
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+DOC_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+SheetInfo = namedtuple('SheetInfo', ['name', 'dimension'])
+
+# read_excel engines, fastest first, with the package each one needs
+READER_ENGINES = {
+    'calamine': 'python_calamine',
+    'openpyxl': 'openpyxl',
+}
+
+def available_engines():
+    return [engine for engine, package in READER_ENGINES.items() if importlib.util.find_spec(package)]
+
+def resolve_engine(engine='auto'):
+    """Map a reader choice to a read_excel engine; 'auto' picks the fastest installed one."""
+    installed = available_engines()
+    if engine == 'auto':
+        return installed[0] if installed else 'openpyxl'
+    if engine not in READER_ENGINES:
+        raise ValueError(f"Unknown Excel reader '{engine}', expected one of: auto, {', '.join(READER_ENGINES)}")
+    if engine not in installed:
+        raise ValueError(f"Excel reader '{engine}' needs the {READER_ENGINES[engine]} package, which is not installed")
+    return engine
+
+TEST_SCRIPT_COLUMNS = [
+    'NO.', 
+    'TEST SCRIPT NUMBER',
+    'TEST SCRIPT DESCRIPTION/SCENARIO',
+    'TEST OBJECT NAME',
+    'Scenario Type',
+    'GENERAL INFORMATION / SUMMARY OF THE TEST SCRIPT',
+    'PRE-REQUISITES',
+    'Execution_Sequence',
+    'Expected_Result',
+    'Product / Akad',
+    'Feature',
+    'Assigned Tester'
+]
+COLUMN_RENAMES = {
+    'EXECUTION SEQUENCE': 'Execution_Sequence',
+    'EXPECTED RESULT': 'Expected_Result'
+}
+HEADER_MATCH_RATIO = 0.6  # Share of TEST_SCRIPT_COLUMNS a row must name to count as the header
+HEADER_PROBE_ROWS = 50
+KNOWN_LAYOUTS_MAX = 32
+# Large-file mode: rows read and transformed at a time, which bounds its memory use
+LARGE_FILE_CHUNK_ROWS = 20000
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024  # Upload copies larger than this are spooled to disk
+
+# Where a template's header sits and what it says; usecols/names are what read_test_sheet parses
+HeaderLayout = namedtuple('HeaderLayout', ['header_row', 'signature', 'usecols', 'names'])
+_known_layouts = []  # Most recently matched first
+_known_layouts_lock = threading.Lock()
+
+def find_header_row(df):
+    """Position of the first row naming enough test-script columns, or None."""
+    cells = df.astype(str)
+    matches = sum(cells.eq(column).any(axis=1).to_numpy(dtype=int) for column in TEST_SCRIPT_COLUMNS)
+    rows = np.flatnonzero(matches >= len(TEST_SCRIPT_COLUMNS) * HEADER_MATCH_RATIO)
+    return int(rows[0]) if len(rows) else None
+
+def locate_header(df):
+    """Return df with the test-script header row as its columns.
+
+    Frames from read_test_sheet already carry the header and only lose their
+    empty rows; raw sheets are trimmed and scanned for the header row.
+    """
+    column_names = set(df.columns.astype(str))
+    if len(column_names.intersection(TEST_SCRIPT_COLUMNS)) >= len(TEST_SCRIPT_COLUMNS) * HEADER_MATCH_RATIO:
+        return df.dropna(how='all').reset_index(drop=True)
+
+    df = df.dropna(how='all').dropna(axis=1, how='all').reset_index(drop=True)
+    header_row_index = find_header_row(df)
+    if header_row_index is None:
+        raise ValueError("Could not find the header row with the required columns.")
+    df.columns = df.iloc[header_row_index]
+    return df.iloc[header_row_index + 1:].reset_index(drop=True)
+
+def _row_signature(probe, row):
+    return tuple(probe.iloc[row].astype(str))
+
+def detect_layout(probe):
+    """HeaderLayout of a probed sheet, or None if it has no test-script header.
+
+    Sheets from a template seen before are recognised by comparing a single
+    row against the remembered header instead of scanning the probe.
+    """
+    with _known_layouts_lock:
+        known = list(_known_layouts)
+    for layout in known:
+        if layout.header_row < len(probe) and _row_signature(probe, layout.header_row) == layout.signature:
+            break
+    else:
+        header_row = find_header_row(probe)
+        if header_row is None:
+            return None
+        header = list(probe.iloc[header_row])
+        usecols = [i for i, name in enumerate(header) if COLUMN_RENAMES.get(name, name) in TEST_SCRIPT_COLUMNS]
+        layout = HeaderLayout(header_row, _row_signature(probe, header_row), usecols, [header[i] for i in usecols])
+
+    with _known_layouts_lock:
+        if layout in _known_layouts:
+            _known_layouts.remove(layout)
+        _known_layouts.insert(0, layout)
+        del _known_layouts[KNOWN_LAYOUTS_MAX:]
+    return layout
+
+def read_test_sheet(workbook, sheet_name):
+    """Read only the test-script columns of a sheet, as text.
+
+    The first HEADER_PROBE_ROWS rows are probed for the header row (see
+    detect_layout), then the sheet is re-read from just below it with usecols limited to the
+    test-script columns, so auxiliary columns are never materialized. Sheets
+    whose header is not in the probe are read whole.
+    """
+    with span('detect_header') as counters:
+        probe = workbook.parse(sheet_name, header=None, nrows=HEADER_PROBE_ROWS)
+        layout = detect_layout(probe)
+        counters['header_row'] = None if layout is None else layout.header_row
+    with span('parse', engine=workbook.engine) as counters:
+        if layout is None:
+            df = workbook.parse(sheet_name)
+        elif layout.header_row + 1 == len(probe) < HEADER_PROBE_ROWS:
+            df = pd.DataFrame(columns=layout.names, dtype=object)  # Nothing below the header
+        else:
+            df = workbook.parse(
+                sheet_name, header=None, skiprows=layout.header_row + 1, usecols=layout.usecols, names=layout.names, dtype=str
+            )
+        counters['rows'] = len(df)
+    return df
+
+def _cell_value(cell):
+    # As pandas' openpyxl reader converts cells, so chunks parse like read_excel
+    if cell.value is None:
+        return ''
+    if cell.data_type == 'e':
+        return np.nan
+    if cell.data_type == 'n':
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+def _stream_rows(workbook, sheet_name, first_row=0, columns=None):
+    """Yield the converted cells of a sheet's rows from first_row on (0-based), only those at columns if given.
+
+    Uses openpyxl's read-only mode, which parses the sheet's XML as it goes
+    instead of loading it.
+    """
+    import openpyxl
+    workbook.source.seek(0)
+    book = openpyxl.load_workbook(workbook.source, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book[sheet_name]
+        sheet.reset_dimensions()  # The stored <dimension> may be wrong
+        for row in sheet.iter_rows(min_row=first_row + 1):
+            if columns is None:
+                yield [_cell_value(cell) for cell in row]
+            else:
+                yield [_cell_value(row[i]) if i < len(row) else '' for i in columns]
+    finally:
+        book.close()
+
+def _parse_rows(rows, names=None, dtype=None):
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    return TextParser(rows, names=names, header=None, dtype=dtype, skip_blank_lines=False).read()
+
+def _stream_frames(workbook, sheet_name, layout, chunk_rows):
+    """Frames of up to chunk_rows rows from below the header, parsed like read_test_sheet parses the whole."""
+    rows = _stream_rows(workbook, sheet_name, layout.header_row + 1, layout.usecols)
+    with closing(rows):
+        while True:
+            with span('parse', engine='openpyxl', streamed=True) as counters:
+                batch = list(islice(rows, chunk_rows))
+                counters['rows'] = len(batch)
+                if not batch:
+                    return
+                # A column with no text in this batch parses as float, unlike in the whole sheet
+                frame = _parse_rows(batch, layout.names, str).astype(object)
+            yield frame
+
+def read_test_sheet_chunks(workbook, sheet_name, chunk_rows=LARGE_FILE_CHUNK_ROWS):
+    """Read a sheet like read_test_sheet, as frames of about chunk_rows rows, without ever holding it whole.
+
+    Rows are streamed with openpyxl's read-only reader, header probe
+    included. Every frame after the first starts on a row with a TEST
+    SCRIPT NUMBER, so no test script is split between frames; one longer
+    than chunk_rows makes its frame longer. Sheets without a header or that
+    column are read whole, as one frame.
+    """
+    with span('detect_header') as counters:
+        with closing(_stream_rows(workbook, sheet_name)) as rows:
+            probe = list(islice(rows, HEADER_PROBE_ROWS))
+        layout = detect_layout(_parse_rows(probe)) if probe else None
+        counters['header_row'] = None if layout is None else layout.header_row
+    if layout is None or 'TEST SCRIPT NUMBER' not in layout.names:
+        yield read_test_sheet(workbook, sheet_name)
+        return
+
+    script_column = layout.names.index('TEST SCRIPT NUMBER')
+    carry = None  # Rows of the last test script read so far
+    for frame in _stream_frames(workbook, sheet_name, layout, chunk_rows):
+        if carry is not None:
+            frame = pd.concat([carry, frame], ignore_index=True)
+        starts = np.flatnonzero(frame.iloc[:, script_column].notna().to_numpy())
+        if len(starts) > 1:  # Cut before the last script, leaving at least one
+            yield frame.iloc[:starts[-1]]
+            carry = frame.iloc[starts[-1]:].reset_index(drop=True)
+        else:
+            carry = frame
+    if carry is None:
+        carry = pd.DataFrame(columns=layout.names, dtype=object)  # Nothing below the header
+    yield carry
+
+def _read_dimension(archive, path):
+    # <dimension> sits before <sheetData>, so only the head of the sheet is inflated
+    with archive.open(path) as stream:
+        for _, element in ElementTree.iterparse(stream, events=('start',)):
+            if element.tag == f'{MAIN_NS}dimension':
+                return element.get('ref')
+            if element.tag == f'{MAIN_NS}sheetData':
+                return None
+    return None
+
+def list_sheets(source):
+    """List the worksheets of an XLSX file from its manifest.
+
+    Reads xl/workbook.xml, its relationships and the <dimension> of each
+    worksheet instead of loading the workbook. Chartsheets are skipped, as in
+    pd.ExcelFile.sheet_names. Returns a list of SheetInfo(name, dimension).
+    """
+    with zipfile.ZipFile(source) as archive:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {
+            rel.get('Id'): (rel.get('Type', ''), rel.get('Target'))
+            for rel in rels.iter(f'{PKG_REL_NS}Relationship')
+        }
+        sheets = []
+        for sheet in workbook.iter(f'{MAIN_NS}sheet'):
+            rel_type, target = targets.get(sheet.get(f'{DOC_REL_NS}id'), ('', None))
+            if rel_type.endswith('/chartsheet'):
+                continue
+            dimension = None
+            if target:
+                path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+                if path in archive.NameToInfo:
+                    dimension = _read_dimension(archive, path)
+            sheets.append(SheetInfo(sheet.get('name'), dimension))
+    return sheets
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory file that carries a file name, like Streamlit's UploadedFile."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+class SpooledUpload(tempfile.SpooledTemporaryFile):
+    """Temporary copy of an upload that carries its file name; copies over UPLOAD_SPOOL_BYTES are kept on disk."""
+
+    def __init__(self, name, max_size=UPLOAD_SPOOL_BYTES):
+        super().__init__(max_size=max_size)
+        self._upload_name = name
+
+    @property
+    def name(self):
+        return self._upload_name
+
+def spool_upload(uploaded_file):
+    """Copy an UploadedFile (or any named binary file) into a SpooledUpload, a block at a time."""
+    spooled = SpooledUpload(uploaded_file.name)
+    uploaded_file.seek(0)
+    shutil.copyfileobj(uploaded_file, spooled)
+    uploaded_file.seek(0)
+    spooled.seek(0)
+    return spooled
+
+class WorkbookSession:
+    """An Excel workbook opened once and shared by every read in a run."""
+
+    def __init__(self, source, name=None, engine='auto'):
+        self.source = source
+        self.name = name if name is not None else source.name
+        self.engine = resolve_engine(engine)
+        self._excel_file = None
+        self._sheets = None
+        self._digest = None
+
+    @property
+    def excel_file(self):
+        # Opened lazily so a session costs nothing until a sheet is actually read
+        if self._excel_file is None:
+            self._excel_file = pd.ExcelFile(self.source, engine=self.engine)
+        return self._excel_file
+
+    @property
+    def digest(self):
+        """SHA-256 of the file content, used to key cached sheets across reruns."""
+        if self._digest is None:
+            self.source.seek(0)
+            self._digest = hashlib.file_digest(self.source, 'sha256').hexdigest()
+            self.source.seek(0)
+        return self._digest
+
+    @property
+    def size(self):
+        size = self.source.seek(0, io.SEEK_END)
+        self.source.seek(0)
+        return size
+
+    def read_bytes(self):
+        self.source.seek(0)
+        data = self.source.read()
+        self.source.seek(0)
+        return data
+
+    @property
+    def sheets(self):
+        if self._sheets is None:
+            try:
+                self._sheets = list_sheets(self.source)
+            except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+                # Not a plain XLSX package, let pandas work out the sheet names
+                self._sheets = [SheetInfo(name, None) for name in self.excel_file.sheet_names]
+        return self._sheets
+
+    @property
+    def sheet_names(self):
+        return [sheet.name for sheet in self.sheets]
+
+    def parse(self, sheet_name, **kwargs):
+        return self.excel_file.parse(sheet_name=sheet_name, **kwargs)
+
+    def close(self):
+        if self._excel_file is not None:
+            self._excel_file.close()
+            self._excel_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+@contextmanager
+def workbook_session(input_file):
+    """Yield input_file if it is already a session, otherwise a session closed on exit."""
+    if isinstance(input_file, WorkbookSession):
+        yield input_file
+    else:
+        with WorkbookSession(input_file) as workbook:
+            yield workbook
+
+@contextmanager
+def open_workbooks(uploaded_files, engine='auto'):
+    """Open one session per uploaded file, keyed by file name, and close them all on exit."""
+    with ExitStack() as stack:
+        workbooks = {}
+        for uploaded_file in uploaded_files:
+            if uploaded_file.name not in workbooks:
+                workbooks[uploaded_file.name] = stack.enter_context(WorkbookSession(uploaded_file, engine=engine))
+        yield workbooks
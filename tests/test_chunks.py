@@ -0,0 +1,62 @@
+import io
+import random
+import pytest
+import xlsxwriter
+from benchmarks.workbooks import HEADER
+from modules import convert, splitter
+from modules.transform import transform_chunks
+from modules.workbook import NamedBytesIO, WorkbookSession, read_test_sheet, read_test_sheet_chunks
+
+PARAMS = ('EP-1', 'Feature', 'Squad')
+
+def _workbook(seed, scripts):
+    """A sheet with a title above the header, and scripts with continuation rows and blank rows between them."""
+    rnd = random.Random(seed)
+    data = io.BytesIO()
+    workbook = xlsxwriter.Workbook(data)
+    worksheet = workbook.add_worksheet('Sheet1')
+    worksheet.write(0, 0, 'Title')
+    worksheet.write_row(2, 1, HEADER)
+    row = 3
+    if rnd.random() < 0.5:
+        worksheet.write(row, 3, 'row before the first script')
+        row += 1
+    for _ in range(scripts):
+        worksheet.write(row, 2, rnd.choice([f"TS-{rnd.randint(0, scripts)}", rnd.randint(0, 50), 'NA']))
+        for column in range(3, 13):
+            value = rnd.choice(['x', '1. a\n2. b', 3, 2.5, None, 'null'])
+            if value is not None:
+                worksheet.write(row, column, value)
+        row += 1
+        for _ in range(rnd.choice([0, 0, 1, 3])):
+            worksheet.write(row, 8, f"{rnd.randint(1, 3)}. continued\n4. more")
+            worksheet.write(row, 9, 'result')
+            row += 1
+        if rnd.random() < 0.1:
+            row += 1
+    workbook.close()
+    return data.getvalue()
+
+def _cells(df):
+    return [
+        [None if value is None or (isinstance(value, float) and value != value) else value for value in row]
+        for row in df.astype(object).itertuples(index=False, name=None)
+    ]
+
+def _dtypes(df):
+    return [str(dtype) for dtype in df.dtypes]
+
+@pytest.mark.parametrize('page', [splitter, convert], ids=['splitter', 'convert'])
+@pytest.mark.parametrize('seed', range(8))
+def test_chunks_match_whole_sheet(page, seed):
+    with WorkbookSession(NamedBytesIO(_workbook(seed, 120), 'pack [funding].xlsx'), engine='openpyxl') as workbook:
+        whole = page.funding_transform(read_test_sheet(workbook, 'Sheet1'), *PARAMS)
+        for chunk_rows in (7, 40, 1000):
+            chunks = list(transform_chunks(
+                read_test_sheet_chunks(workbook, 'Sheet1', chunk_rows), page.funding_transform, *PARAMS
+            ))
+            if chunk_rows == 7:
+                assert len(chunks) > 1
+            assert sum((_cells(chunk) for chunk in chunks), []) == _cells(whole)
+            assert all(list(chunk.columns) == list(whole.columns) for chunk in chunks)
+            assert all(_dtypes(chunk) == _dtypes(whole) for chunk in chunks)
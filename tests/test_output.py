@@ -0,0 +1,40 @@
+import io
+import openpyxl
+import pandas as pd
+import pytest
+from modules import output
+from modules.profiling import Profile
+
+def test_write_xlsx_raises_past_the_row_limit(monkeypatch):
+    monkeypatch.setattr(output, 'EXCEL_MAX_ROWS', 11)
+    df = pd.DataFrame({'a': range(10)})
+    data = io.BytesIO()
+    output.write_xlsx([('fits', df)], data)
+    assert openpyxl.load_workbook(data).active.max_row == 11
+
+    with pytest.raises(ValueError, match="This sheet is too large"):
+        output.write_xlsx([('rows', [df, df.head(1)])], io.BytesIO())
+
+def test_write_xlsx_raises_past_the_column_limit(monkeypatch):
+    monkeypatch.setattr(output, 'EXCEL_MAX_COLUMNS', 3)
+    with pytest.raises(ValueError, match="This sheet is too large"):
+        output.write_xlsx([('columns', pd.DataFrame([[1, 2, 3, 4]]))], io.BytesIO())
+
+@pytest.mark.parametrize('file_format', ['xlsx', 'parquet', 'arrow'])
+def test_threaded_zip_members_are_profiled(file_format):
+    df = pd.DataFrame({'a': range(10)})
+    with Profile().activate() as profile:
+        output.write_zip([('one', df), ('two', df)], io.BytesIO(), file_format, workers=2)
+    members = [record for record in profile.spans if record['name'] == f'write_{file_format}']
+    assert len(members) == 2
+    assert all(record['parent'] == 'write_zip' for record in members)
+
+def test_combined_xlsx_raises_past_the_row_limit(monkeypatch):
+    monkeypatch.setattr(output, 'EXCEL_MAX_ROWS', 16)
+    df = pd.DataFrame({'a': range(5)})
+    writer = output.CombinedWriter(io.BytesIO(), 'xlsx')
+    writer.append(df)
+    writer.append(df)
+    writer.append(df)
+    with pytest.raises(ValueError, match="This sheet is too large"):
+        writer.append(df.head(1))
@@ -0,0 +1,87 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.workbooks import HEADER
+from modules.cache import exploded_blocks
+from modules.profiling import Profile
+from modules.splitter import funding_transform
+from modules.transform import incremental_explode
+
+PARAMS = ('EP-1', 'Feature', 'Squad')
+
+def _cell(rnd, kind):
+    r = rnd.random()
+    if r < 0.15:
+        return np.nan
+    if kind == 'steps':
+        if r < 0.25:
+            return 'plain text'
+        return '\n'.join(f"{step}. step {rnd.randint(0, 3)}" for step in range(1, rnd.randint(1, 4) + 1))
+    return rnd.choice(['a', 'b', 'c'])
+
+def _block(rnd, number):
+    """Rows of one test script: a numbered row, then a few continuation rows without a number."""
+    return [
+        [np.nan, number if row == 0 else np.nan]
+        + [_cell(rnd, 'other') for _ in range(5)] + [_cell(rnd, 'steps'), _cell(rnd, 'steps')]
+        + [_cell(rnd, 'other') for _ in range(3)]
+        for row in range(rnd.choice([1, 1, 2, 3]))
+    ]
+
+def _revise(rnd, blocks):
+    """A revision of a test pack: some scripts edited, dropped, added or moved."""
+    revised = []
+    for block in blocks:
+        r = rnd.random()
+        if r < 0.1:
+            continue
+        if r < 0.25:
+            block = [list(row) for row in block]
+            row = rnd.choice(block)
+            row[rnd.randrange(2, len(row))] = _cell(rnd, 'steps')
+        revised.append(block)
+        if rnd.random() < 0.1:
+            revised.append(_block(rnd, f"TS-new-{rnd.randint(0, 99)}"))
+    if len(revised) > 1 and rnd.random() < 0.5:
+        revised.insert(rnd.randrange(len(revised)), revised.pop(rnd.randrange(len(revised))))
+    return revised
+
+def _sheet(blocks):
+    rows = [row for block in blocks for row in block]
+    df = pd.DataFrame(rows, columns=HEADER)
+    df['NO.'] = np.arange(1, len(df) + 1)
+    return df
+
+@pytest.mark.parametrize('seed', range(20))
+def test_incremental_matches_full_on_revised_sheets(seed):
+    rnd = random.Random(seed)
+    exploded_blocks.clear()
+    # Repeated script numbers too, which are still separate blocks
+    blocks = [_block(rnd, f"TS-{rnd.randint(0, 30)}") for _ in range(rnd.randint(1, 30))]
+    with incremental_explode():
+        funding_transform(_sheet(blocks), *PARAMS)
+
+    for _ in range(3):
+        blocks = _revise(rnd, blocks)
+        sheet = _sheet(blocks)
+        with Profile().activate() as profile, incremental_explode():
+            incremental = funding_transform(sheet, *PARAMS)
+        pd.testing.assert_frame_equal(incremental, funding_transform(sheet, *PARAMS))
+        explodes = [record for record in profile.spans if 'reused_blocks' in record]
+        assert sum(record['reused_blocks'] for record in explodes) <= sum(record['blocks'] for record in explodes)
+
+def test_revision_reuses_unchanged_blocks():
+    rnd = random.Random(0)
+    exploded_blocks.clear()
+    blocks = [_block(rnd, f"TS-{number}") for number in range(20)]
+    with incremental_explode():
+        funding_transform(_sheet(blocks), *PARAMS)
+
+    blocks[5][0][HEADER.index('EXPECTED RESULT')] = '1. changed'
+    sheet = _sheet(blocks)
+    with Profile().activate() as profile, incremental_explode():
+        incremental = funding_transform(sheet, *PARAMS)
+    pd.testing.assert_frame_equal(incremental, funding_transform(sheet, *PARAMS))
+    explodes = [record for record in profile.spans if 'reused_blocks' in record]
+    assert sum(record['reused_blocks'] for record in explodes) >= 19
@@ -0,0 +1,52 @@
+import io
+import re
+import zipfile
+import pytest
+import xlsxwriter
+from modules.verifier import verify_excel
+from modules.workbook import NamedBytesIO, available_engines
+
+HEADER = ['TEST SCRIPT NUMBER', 'Execution_Sequence', 'Expected_Result']
+ENGINES = available_engines()
+
+def _workbook(first_row=0):
+    data = io.BytesIO()
+    workbook = xlsxwriter.Workbook(data)
+    worksheet = workbook.add_worksheet('Sheet1')
+    worksheet.write_row(first_row, 0, HEADER)
+    worksheet.write_row(first_row + 1, 0, ['TS-1', '1. open', '1. opens'])
+    worksheet.write_row(first_row + 2, 1, ['2. save'])  # No expected result
+    worksheet.write_row(first_row + 3, 0, ['TS-2', '1. close', '1. closes'])
+    workbook.close()
+    return data.getvalue()
+
+def _stale_dimension(data):
+    """data with the sheet's stored <dimension> cut down to A1, as some writers leave it."""
+    source = zipfile.ZipFile(io.BytesIO(data))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w') as target:
+        for item in source.infolist():
+            content = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                content = re.sub(rb'<dimension ref="[^"]*"/>', b'<dimension ref="A1"/>', content)
+            target.writestr(item, content)
+    return output.getvalue()
+
+def _verify(data, engine):
+    return verify_excel(NamedBytesIO(data, 'report.xlsx'), engine).to_dict('records')
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_reports_mismatched_scripts(engine):
+    assert _verify(_workbook(), engine) == [
+        {'File Name': 'report.xlsx', 'Script ID': 'TS-1', 'Test Steps': 2, 'Expected Results': 1}
+    ]
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_stale_dimension(engine):
+    assert _verify(_stale_dimension(_workbook()), engine) == _verify(_workbook(), engine)
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_header_is_the_first_row(engine):
+    assert _verify(_workbook(first_row=1), engine) == [
+        {'File Name': 'report.xlsx', 'Error': "Processing error: 'TEST SCRIPT NUMBER'"}
+    ]